@@ -25,3 +25,19 @@ def get_db():
         db.close()
 
 db_dependency = Annotated[Session, Depends(get_db)]
+
+# Columns added after document_logs was created. Applied idempotently at startup.
+SCHEMA_UPDATES = [
+    "ALTER TABLE document_logs ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_document_logs_content_hash ON document_logs (content_hash)",
+    "ALTER TABLE document_logs ADD COLUMN IF NOT EXISTS doc_type_corrected BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE document_logs ADD COLUMN IF NOT EXISTS stage_timings JSON",
+    "ALTER TABLE document_logs ADD COLUMN IF NOT EXISTS parent_id INTEGER REFERENCES document_logs (id)",
+    "CREATE INDEX IF NOT EXISTS ix_document_logs_parent_id ON document_logs (parent_id)",
+    "ALTER TABLE document_logs ADD COLUMN IF NOT EXISTS extracted_text TEXT",
+]
+
+def apply_schema_updates():
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPDATES:
+            conn.execute(text(statement))
@@ -1,6 +1,6 @@
 from datetime import datetime
 from app.database.database import Base
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, ForeignKey
 
 
 
@@ -15,5 +15,12 @@ class Document_logs(Base):
     processing_time_ms = Column(Integer, nullable=False)
     summary = Column(Text, nullable=False)
     file_url = Column(String(1024), nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)
+    doc_type_corrected = Column(Boolean, nullable=False, default=False)
+    stage_timings = Column(JSON, nullable=True)
+    # Set on email attachments, pointing at the email they came from
+    parent_id = Column(Integer, ForeignKey("document_logs.id"), nullable=True, index=True)
+    # Leading part of the extracted text, used to train the local classifier
+    extracted_text = Column(Text, nullable=True)
 
 
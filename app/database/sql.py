@@ -1,7 +1,8 @@
 from app.database.database import sessionlocal, db_dependency
 from app.database.model import Document_logs
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from app.helpers.tracing import traced
 
 class DocRequest(BaseModel):
     document_name: str
@@ -10,12 +11,21 @@ class DocRequest(BaseModel):
     processing_time_ms: int
     summary: str
     file_url: str
+    content_hash: Optional[str] = None
+    stage_timings: Optional[dict] = None
+    parent_id: Optional[int] = None
+    extracted_text: Optional[str] = None
 
 class DocUpdateRequest(BaseModel):
     source: Optional[str] = None
     doc_type_predicted: Optional[str] = None
     summary: Optional[str] = None
 
+class ClassifyBatchRequest(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = None
+
+@traced("db.insert_document_log")
 def insert_document_log(db: db_dependency, doc: DocRequest):
     try:
         doc_data = Document_logs(**doc.model_dump())
@@ -26,6 +36,26 @@ def insert_document_log(db: db_dependency, doc: DocRequest):
     finally:
         db.close()
 
+@traced("db.insert_document_with_children")
+def insert_document_with_children(db: db_dependency, doc: DocRequest, children: List[DocRequest]):
+    """Insert a document and its attachments in one transaction; children get its id as parent_id."""
+    try:
+        parent = Document_logs(**doc.model_dump())
+        db.add(parent)
+        # Flush to get the parent id without committing
+        db.flush()
+        for child in children:
+            db.add(Document_logs(**child.model_dump(exclude={"parent_id"}), parent_id=parent.id))
+        db.commit()
+        db.refresh(parent)
+        return parent
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@traced("db.get_document_by_id")
 def get_document_by_id(db: db_dependency, doc_id: int):
     try:
         return db.query(Document_logs).filter(Document_logs.id == doc_id).first()
@@ -33,6 +63,7 @@ def get_document_by_id(db: db_dependency, doc_id: int):
         db.close()
 
 
+@traced("db.update_document_by_id")
 def update_document_by_id(db : db_dependency,
     doc: DocUpdateRequest,
     doc_id: int
@@ -47,13 +78,18 @@ def update_document_by_id(db : db_dependency,
         for key, value in doc_data.items():
             setattr(existing_doc, key, value)
 
+        # A reviewer setting the type marks the row as ground truth for the local classifier
+        if doc_data.get("doc_type_predicted"):
+            existing_doc.doc_type_corrected = True
+
         db.commit()
-        db.refresh(doc)
-        return doc
+        db.refresh(existing_doc)
+        return existing_doc
     finally:
         db.close()
 
 
+@traced("db.delete_document_by_id")
 def delete_document_by_id(db: db_dependency, doc_id: int) -> bool:
     try:
         doc = db.query(Document_logs).filter(Document_logs.id == doc_id).first()
@@ -67,6 +103,7 @@ def delete_document_by_id(db: db_dependency, doc_id: int) -> bool:
         db.close()
 
 
+@traced("db.delete_all_document_logs")
 def delete_all_document_logs(db: db_dependency):
 
     try:
@@ -75,8 +112,10 @@ def delete_all_document_logs(db: db_dependency):
     finally:
         db.close()
 
-from sqlalchemy import func
+from sqlalchemy import func, or_
+from app.helpers.doc_types import FAILED_DOC_TYPE, SUMMARY_FALLBACK
 
+@traced("db.get_doc_type_count")
 def get_doc_type_count(db: db_dependency):
     try:
         return (
@@ -91,6 +130,7 @@ def get_doc_type_count(db: db_dependency):
     finally:
         db.close()
 
+@traced("db.get_source_options")
 def get_source_options(db: db_dependency):
     try:
         sources = (
@@ -105,6 +145,7 @@ def get_source_options(db: db_dependency):
     finally:
         db.close()
 
+@traced("db.get_avg_processing_time")
 def get_avg_processing_time(db: db_dependency):
     try:
         return (
@@ -120,6 +161,7 @@ def get_avg_processing_time(db: db_dependency):
         db.close()
 
 
+@traced("db.get_recent_documents")
 def get_recent_documents(
     db: db_dependency,
     selected_source=None,
@@ -159,8 +201,90 @@ def get_recent_documents(
         db.close()
 
 
+@traced("db.get_details_by_id")
 def get_details_by_id(db: db_dependency, doc_id: int):
     try:
         return db.query(Document_logs).filter(Document_logs.id == doc_id).first()
     finally:
         db.close()
+
+
+@traced("db.get_document_by_content_hash")
+def get_document_by_content_hash(db: db_dependency, content_hash: str):
+    """Latest successfully analyzed document with the same content hash."""
+    try:
+        return (
+            db.query(Document_logs)
+            .filter(Document_logs.content_hash == content_hash)
+            .filter(func.lower(Document_logs.doc_type_predicted) != FAILED_DOC_TYPE)
+            # A placeholder summary means the LLM failed part-way; analyze such documents again
+            .filter(or_(Document_logs.summary.is_(None), Document_logs.summary != SUMMARY_FALLBACK))
+            .order_by(Document_logs.id.desc())
+            .first()
+        )
+    finally:
+        db.close()
+
+
+@traced("db.get_corrected_documents")
+def get_corrected_documents(db: db_dependency, limit: int = 5000):
+    """Most recent documents whose type was set manually and whose extracted text was stored."""
+    try:
+        return (
+            db.query(Document_logs)
+            .filter(Document_logs.doc_type_corrected.is_(True))
+            .filter(Document_logs.extracted_text.isnot(None))
+            .order_by(Document_logs.id.desc())
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+@traced("db.get_documents_after_id")
+def get_documents_after_id(db: db_dependency, after_id: int, limit: int,
+    source=None, doc_type=None, include_corrected=False
+):
+    """Next chunk of rows in id order (keyset pagination), for bulk reprocessing."""
+    try:
+        query = db.query(Document_logs).filter(Document_logs.id > after_id)
+        if source:
+            query = query.filter(Document_logs.source == source)
+        if doc_type:
+            query = query.filter(Document_logs.doc_type_predicted == doc_type)
+        if not include_corrected:
+            # Manually corrected types are ground truth; leave them alone
+            query = query.filter(Document_logs.doc_type_corrected.is_(False))
+        return query.order_by(Document_logs.id.asc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+@traced("db.update_document_results")
+def update_document_results(db: db_dependency, updates: list):
+    """Write reprocessed doc types/summaries for many rows in one transaction."""
+    try:
+        if updates:
+            db.bulk_update_mappings(Document_logs, updates)
+            db.commit()
+        return len(updates)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@traced("db.get_child_documents")
+def get_child_documents(db: db_dependency, parent_id: int):
+    """Attachments recorded under a parent document, in insertion order."""
+    try:
+        return (
+            db.query(Document_logs)
+            .filter(Document_logs.parent_id == parent_id)
+            .order_by(Document_logs.id.asc())
+            .all()
+        )
+    finally:
+        db.close()
@@ -0,0 +1,12 @@
+"""
+Local fake services for load testing (python -m app.fakes).
+
+Latency, failures and outputs are configured per service with environment variables:
+    FAKE_{OCR,AZURE,GEMINI}_LATENCY          ms, or "uniform:100,400", "normal:300,50", "lognormal:300,0.5", "exp:300"
+    FAKE_{OCR,AZURE,GEMINI}_ERROR_RATE       share of requests failing with 500 (0-1)
+    FAKE_{OCR,AZURE,GEMINI}_RATE_LIMIT_RATE  share of requests answered with 429 (0-1)
+    FAKE_{OCR,AZURE,GEMINI}_RETRY_AFTER      Retry-After seconds sent with 429s
+    FAKE_CANNED_FILE                         JSON with "ocr_text", "summary" and optionally "doc_type"
+    FAKE_SEED                                seed for reproducible runs
+or at runtime through PUT /_fake/config/{service}.
+"""
@@ -0,0 +1,11 @@
+import argparse
+import uvicorn
+
+from app.fakes.server import app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the fake Document Intelligence / Azure OpenAI / Gemini services.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,146 @@
+"""
+Configurable latency, failure and canned-output behaviour for the fake services.
+"""
+
+import os
+import json
+import random
+import threading
+from collections import Counter as TallyCounter
+
+SERVICES = ("ocr", "azure", "gemini")
+
+DEFAULT_OCR_TEXT = (
+    "POLICE INCIDENT REPORT\n"
+    "Case Number: 2024-001234\n"
+    "Police Department: Springfield PD\n"
+    "On March 15, 2024 officers responded to a motor vehicle accident at Main St and Oak Ave."
+)
+DEFAULT_SUMMARY = (
+    "This is a canned summary from the local fake service. "
+    "It stands in for a real model response during load tests."
+)
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution in milliseconds:
+    "200" or "fixed:200", "uniform:100,400", "normal:300,50",
+    "lognormal:300,0.5" (median, sigma) or "exp:300" (mean).
+    Returns a function that samples seconds.
+    """
+    spec = str(spec or "0").strip().lower()
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    values = [float(value) for value in params.split(",") if value.strip()]
+
+    if kind == "fixed":
+        sample = lambda rng: values[0]
+    elif kind == "uniform":
+        sample = lambda rng: rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        sample = lambda rng: rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        import math
+        mu = math.log(max(values[0], 1e-3))
+        sample = lambda rng: rng.lognormvariate(mu, values[1])
+    elif kind == "exp":
+        sample = lambda rng: rng.expovariate(1.0 / values[0]) if values[0] else 0.0
+    else:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    return lambda rng: max(0.0, sample(rng)) / 1000.0
+
+
+class ServiceBehavior:
+    """Latency and failure injection for one fake service."""
+
+    def __init__(self, latency="0", error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0):
+        self.update(latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate, retry_after=retry_after)
+
+    def update(self, **settings):
+        if "latency" in settings:
+            self._latency = parse_latency(settings["latency"])
+            self.latency = str(settings["latency"])
+        for name in ("error_rate", "rate_limit_rate", "retry_after"):
+            if name in settings:
+                setattr(self, name, float(settings[name]))
+
+    def sample_latency(self, rng):
+        return self._latency(rng)
+
+    def draw_outcome(self, rng):
+        """'rate_limited', 'error' or 'ok' according to the configured rates."""
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def as_dict(self):
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "retry_after": self.retry_after,
+        }
+
+
+def behavior_from_env(service):
+    prefix = f"FAKE_{service.upper()}_"
+    return ServiceBehavior(
+        latency=os.getenv(prefix + "LATENCY", "0"),
+        error_rate=os.getenv(prefix + "ERROR_RATE", "0"),
+        rate_limit_rate=os.getenv(prefix + "RATE_LIMIT_RATE", "0"),
+        retry_after=os.getenv(prefix + "RETRY_AFTER", "1"),
+    )
+
+
+def load_canned(path=None):
+    """Canned outputs: {"ocr_text": ..., "summary": ..., "doc_type": ...}; doc_type is guessed when absent."""
+    canned = {"ocr_text": DEFAULT_OCR_TEXT, "summary": DEFAULT_SUMMARY, "doc_type": None}
+    path = path or os.getenv("FAKE_CANNED_FILE")
+    if path:
+        with open(path, 'r') as f:
+            canned.update(json.load(f))
+    return canned
+
+
+class FakeState:
+    """Behaviour per service, canned outputs and request tallies, shared by all handlers."""
+
+    def __init__(self):
+        seed = os.getenv("FAKE_SEED")
+        self.rng = random.Random(int(seed) if seed else None)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.behaviors = {service: behavior_from_env(service) for service in SERVICES}
+            self.canned = load_canned()
+            self.stats = TallyCounter()
+
+    def draw(self, service):
+        """Sample (latency_seconds, outcome) for one request and record it."""
+        with self.lock:
+            behavior = self.behaviors[service]
+            latency = behavior.sample_latency(self.rng)
+            outcome = behavior.draw_outcome(self.rng)
+            self.stats[f"{service}:{outcome}"] += 1
+        return latency, outcome
+
+    def configure(self, service, **settings):
+        with self.lock:
+            self.behaviors[service].update(**settings)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "services": {service: behavior.as_dict() for service, behavior in self.behaviors.items()},
+                "canned": self.canned,
+            }
+
+
+state = FakeState()
@@ -0,0 +1,268 @@
+"""
+Local stand-ins for Azure Document Intelligence, Azure OpenAI chat completions
+and Gemini generateContent, for load tests and CI without real quota.
+
+Point the app at it with:
+    DOC_INTELLIGENCE_ENDPOINT=http://localhost:8010/
+    AZURE_OPENAI_ENDPOINT=http://localhost:8010/
+    GEMINI_API_ENDPOINT=http://localhost:8010
+"""
+
+import re
+import io
+import json
+import time
+import uuid
+import asyncio
+from datetime import datetime
+
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.fakes.behavior import state, SERVICES
+from app.helpers.doc_types import KEY_PHRASES, KEY_PHRASE_DOC_TYPES, FALLBACK_DOC_TYPE
+
+app = FastAPI(title="IDP fake services", description="Fake Document Intelligence, Azure OpenAI and Gemini endpoints")
+
+# Finished analyze operations are kept this long for polling
+OPERATION_TTL_SECONDS = 600
+_operations = {}
+
+BATCH_COUNT_PATTERN = re.compile(r"JSON array of exactly (\d+) strings")
+BATCH_DOCUMENT_PATTERN = re.compile(r"=== DOCUMENT \d+ ===\n(.*?)\n=== END DOCUMENT \d+ ===", re.DOTALL)
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def guess_doc_type(text):
+    """Canned doc type if configured, otherwise the category whose key phrases occur most often."""
+    if state.canned.get("doc_type"):
+        return state.canned["doc_type"]
+    lowered = text.lower()
+    scores = {label: sum(lowered.count(phrase) for phrase in phrases) for label, phrases in KEY_PHRASES.items()}
+    label = max(scores, key=scores.get)
+    if not scores[label]:
+        return FALLBACK_DOC_TYPE
+    return KEY_PHRASE_DOC_TYPES.get(label, label)
+
+
+def answer_prompt(prompt, structured=False):
+    """Produce a plausible response for the prompts the pipeline sends."""
+    if structured:
+        document = prompt.split("Document Text:", 1)[-1]
+        return json.dumps({"doc_type": guess_doc_type(document), "summary": state.canned["summary"], "confidence": 0.9})
+
+    batch = BATCH_COUNT_PATTERN.search(prompt)
+    if batch:
+        documents = BATCH_DOCUMENT_PATTERN.findall(prompt)
+        labels = [guess_doc_type(document) for document in documents]
+        return json.dumps(labels[:int(batch.group(1))])
+
+    if "## DOCUMENT TO CLASSIFY" in prompt:
+        return guess_doc_type(prompt.split("Document Text:", 1)[-1])
+    return state.canned["summary"]
+
+
+def count_pages(payload):
+    """Page count of an analyze payload: TIFF frames, PDF page objects, otherwise one."""
+    if payload[:4] == b"%PDF":
+        return max(1, len(re.findall(rb"/Type\s*/Page(?!s)", payload)))
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(payload)) as image:
+            return getattr(image, "n_frames", 1)
+    except Exception:
+        return 1
+
+
+async def inject(service, rate_limit_response, error_response):
+    """Sleep for the sampled latency; return an error response when a failure is drawn."""
+    latency, outcome = state.draw(service)
+    await asyncio.sleep(latency)
+    retry_after = state.behaviors[service].retry_after
+    if outcome == "rate_limited":
+        return JSONResponse(rate_limit_response(retry_after), status_code=429, headers={
+            "Retry-After": str(int(max(1, round(retry_after)))),
+            "retry-after-ms": str(int(retry_after * 1000)),
+        })
+    if outcome == "error":
+        return JSONResponse(error_response(), status_code=500)
+    return None
+
+
+# ---------------------------------------------------------------- Document Intelligence
+
+def _analyze_result(model_id, pages):
+    content_parts, page_results, offset = [], [], 0
+    for number, text in enumerate(pages, start=1):
+        page_start, lines = offset, []
+        for line in text.splitlines():
+            lines.append({
+                "content": line,
+                "polygon": [0, 0, 1, 0, 1, 0.1, 0, 0.1],
+                "spans": [{"offset": offset, "length": len(line)}]
+            })
+            offset += len(line) + 1
+        content_parts.append(text)
+        page_results.append({
+            "pageNumber": number, "angle": 0, "width": 8.5, "height": 11, "unit": "inch",
+            "words": [], "lines": lines, "spans": [{"offset": page_start, "length": offset - page_start}]
+        })
+    return {
+        "apiVersion": "2024-11-30",
+        "modelId": model_id,
+        "stringIndexType": "textElements",
+        "content": "\n".join(content_parts),
+        "pages": page_results,
+    }
+
+
+@app.post("/documentintelligence/documentModels/{model_id}:analyze")
+async def analyze_document(model_id: str, request: Request):
+    payload = await request.body()
+    # Latency and failures apply to the whole operation; the POST itself is accepted quickly
+    latency, outcome = state.draw("ocr")
+    retry_after = state.behaviors["ocr"].retry_after
+    if outcome == "rate_limited":
+        return JSONResponse(
+            {"error": {"code": "429", "message": "Requests to the Analyze Document operation have exceeded rate limit. Please retry later."}},
+            status_code=429,
+            headers={"Retry-After": str(int(max(1, round(retry_after))))}
+        )
+
+    now = time.monotonic()
+    for operation_id in [key for key, op in _operations.items() if now - op["created"] > OPERATION_TTL_SECONDS]:
+        _operations.pop(operation_id, None)
+
+    operation_id = str(uuid.uuid4())
+    text = state.canned["ocr_text"]
+    _operations[operation_id] = {
+        "created": now,
+        "ready_at": now + latency,
+        "failed": outcome == "error",
+        "created_iso": _now_iso(),
+        "result": _analyze_result(model_id, [f"{text}\nPage {number}" for number in range(1, count_pages(payload) + 1)]),
+    }
+    api_version = request.query_params.get("api-version", "2024-11-30")
+    location = f"{str(request.base_url).rstrip('/')}/documentintelligence/documentModels/{model_id}/analyzeResults/{operation_id}?api-version={api_version}"
+    return JSONResponse(None, status_code=202, headers={
+        "Operation-Location": location,
+        "retry-after-ms": str(int(min(latency, 1.0) * 1000)),
+    })
+
+
+@app.get("/documentintelligence/documentModels/{model_id}/analyzeResults/{operation_id}")
+async def get_analyze_result(model_id: str, operation_id: str):
+    operation = _operations.get(operation_id)
+    if not operation:
+        raise HTTPException(status_code=404, detail="Operation not found")
+
+    remaining = operation["ready_at"] - time.monotonic()
+    body = {"status": "running", "createdDateTime": operation["created_iso"], "lastUpdatedDateTime": _now_iso()}
+    if remaining > 0:
+        # Tell the poller when to come back, like the real service does
+        return JSONResponse(body, headers={"retry-after-ms": str(int(min(remaining, 1.0) * 1000) + 1)})
+    if operation["failed"]:
+        body.update(status="failed", error={"code": "InternalServerError", "message": "Injected analyze failure"})
+        return JSONResponse(body)
+    body.update(status="succeeded", analyzeResult=operation["result"])
+    return JSONResponse(body)
+
+
+# ---------------------------------------------------------------- Azure OpenAI
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    failure = await inject(
+        "azure",
+        lambda retry_after: {"error": {"code": "429", "message": f"Rate limit is exceeded. Try again in {int(max(1, round(retry_after)))} seconds."}},
+        lambda: {"error": {"code": "InternalServerError", "message": "Injected server error"}},
+    )
+    if failure:
+        return failure
+
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []) if message.get("role") == "user")
+    structured = (body.get("response_format") or {}).get("type") == "json_schema"
+    content = answer_prompt(prompt, structured=structured)
+    prompt_tokens, completion_tokens = _estimate_tokens(prompt), _estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+# ---------------------------------------------------------------- Gemini
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    body = await request.json()
+    failure = await inject(
+        "gemini",
+        lambda retry_after: {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}},
+        lambda: {"error": {"code": 500, "message": "Injected server error", "status": "INTERNAL"}},
+    )
+    if failure:
+        return failure
+
+    prompt = "\n".join(
+        str(part.get("text", ""))
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    text = answer_prompt(prompt)
+    prompt_tokens, completion_tokens = _estimate_tokens(prompt), _estimate_tokens(text)
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": completion_tokens, "totalTokenCount": prompt_tokens + completion_tokens},
+        "modelVersion": model,
+    }
+
+
+# ---------------------------------------------------------------- Control
+
+@app.get("/_fake/config")
+def get_config():
+    return state.snapshot()
+
+
+@app.put("/_fake/config/{service}")
+def set_config(service: str, settings: dict):
+    """Change latency/error_rate/rate_limit_rate/retry_after of one service at runtime."""
+    if service not in SERVICES:
+        raise HTTPException(status_code=404, detail=f"Unknown service: {service}")
+    try:
+        state.configure(service, **{key: value for key, value in settings.items()
+                                    if key in ("latency", "error_rate", "rate_limit_rate", "retry_after")})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return state.snapshot()["services"][service]
+
+
+@app.put("/_fake/canned")
+def set_canned(canned: dict):
+    state.canned.update(canned)
+    return state.canned
+
+
+@app.get("/_fake/stats")
+def get_stats():
+    return dict(state.stats)
+
+
+@app.post("/_fake/reset")
+def reset():
+    """Reload behaviour and canned outputs from the environment and clear the stats."""
+    state.reset()
+    _operations.clear()
+    return state.snapshot()
@@ -4,8 +4,10 @@ from datetime import datetime
 from azure.storage.blob import BlobClient, ContentSettings 
 from app.helpers.config import MY_SAS_URL, CONTAINER_NAME
 from app.helpers.logger import logger
+from app.helpers.tracing import traced, set_attributes
 
 
+@traced("blob.upload")
 def upload_file_to_azure_blob(file_path: str, file_name: str = None) -> str:
     """
     Upload a file to Azure Blob Storage using SAS URL.
@@ -41,6 +43,7 @@ def upload_file_to_azure_blob(file_path: str, file_name: str = None) -> str:
         full_blob_url = f"{base_url.rstrip('/')}/{CONTAINER_NAME}/{blob_name}?{sas_token}"
         
         logger.info(f"Uploading file to Azure Blob: {blob_name}")
+        set_attributes(**{"blob.name": blob_name, "blob.size_bytes": os.path.getsize(file_path)})
         
         # Create Blob Client
         blob_client = BlobClient.from_blob_url(blob_url=full_blob_url)
@@ -63,6 +66,52 @@ def upload_file_to_azure_blob(file_path: str, file_name: str = None) -> str:
         raise
 
 
+@traced("blob.upload")
+def upload_bytes_to_azure_blob(data, file_name: str) -> str:
+    """
+    Upload in-memory content (e.g. an email attachment) to Azure Blob Storage.
+    
+    Args:
+        data: File content, as bytes or a binary file object
+        file_name: Name for the blob
+    
+    Returns:
+        Full SAS URL for accessing the blob
+    """
+    try:
+        # Add timestamp to ensure uniqueness
+        file_ext = os.path.splitext(file_name)[1]
+        file_base = os.path.splitext(file_name)[0]
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        blob_name = f"{file_base}_{timestamp}_{uuid.uuid4().hex[:8]}{file_ext}"
+        
+        if "?" not in MY_SAS_URL:
+            raise ValueError("Invalid SAS URL - missing token")
+        
+        base_url, sas_token = MY_SAS_URL.split("?", 1)
+        full_blob_url = f"{base_url.rstrip('/')}/{CONTAINER_NAME}/{blob_name}?{sas_token}"
+        
+        logger.info(f"Uploading bytes to Azure Blob: {blob_name}")
+        if isinstance(data, bytes):
+            set_attributes(**{"blob.name": blob_name, "blob.size_bytes": len(data)})
+        else:
+            set_attributes(**{"blob.name": blob_name})
+        
+        blob_client = BlobClient.from_blob_url(blob_url=full_blob_url)
+        blob_client.upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=get_content_type(file_name))
+        )
+        
+        logger.info(f"✅ Bytes uploaded to Azure Blob: {blob_name}")
+        return full_blob_url
+    
+    except Exception as e:
+        logger.error(f"Failed to upload bytes to Azure Blob: {str(e)}")
+        raise
+
+
 async def upload_stream_to_azure(file_stream, file_name, content_type):
     """
     Uploads a file stream directly to Azure without saving to disk first.
@@ -132,6 +181,7 @@ def get_content_type(file_name: str) -> str:
     return mime_types.get(ext, 'application/octet-stream')
 
 
+@traced("blob.download")
 def download_file_from_azure_blob(sas_url: str, download_path: str) -> bool:
     """
     Download a file from Azure Blob Storage using SAS URL.
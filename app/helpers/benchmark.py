@@ -4,6 +4,8 @@ import time
 import threading
 from datetime import datetime
 from app.helpers.llm import get_gemini_response_with_context
+from app.helpers.doc_types import FAILED_DOC_TYPE
+from app.helpers.config import BENCHMARK_DATA_FILE
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import asyncio
@@ -38,7 +40,7 @@ benchmark_logger.setLevel(logging.INFO)
 class BenchmarkSystem:
     def __init__(self, test_interval_hours=5):
         self.test_interval = test_interval_hours * 3600  # Convert to seconds
-        self.benchmark_file = 'benchmark_data.json'
+        self.benchmark_file = BENCHMARK_DATA_FILE
         self.last_run_file = 'last_benchmark_run.txt'
         self.running = False
         self.similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
@@ -159,15 +161,15 @@ class BenchmarkSystem:
         for i, test_case in enumerate(test_data):
             try:
                 # Get LLM prediction with retry logic for errors
-                predicted_doc_type = "Error"
+                predicted_doc_type = FAILED_DOC_TYPE
                 summary = "Error"
                 
                 # Retry up to 3 times if we get an error
                 for retry_attempt in range(3):
                     predicted_doc_type, summary = get_gemini_response_with_context(test_case['text'])
                     
-                    # If we got a valid response (not "Error"), break out of retry loop
-                    if predicted_doc_type != "Error":
+                    # If we got a valid response (not a failure), break out of retry loop
+                    if predicted_doc_type != FAILED_DOC_TYPE:
                         break
                     
                     if retry_attempt < 2:  # Don't log on the last attempt
@@ -190,6 +192,9 @@ class BenchmarkSystem:
                 if classification_correct:
                     correct_classifications += 1
                     BENCHMARK_CLASSIFICATION_RESULTS.labels(result_type='correct').inc()
+                elif predicted_doc_type == FAILED_DOC_TYPE:
+                    # Every provider failed on every attempt: an outage, not a wrong answer
+                    BENCHMARK_CLASSIFICATION_RESULTS.labels(result_type='error').inc()
                 else:
                     BENCHMARK_CLASSIFICATION_RESULTS.labels(result_type='incorrect').inc()
                 
@@ -23,7 +23,8 @@ AZURE_SQL_CONFIG = {
     "password": os.getenv("AZURE_SQL_PASSWORD"),
     "driver": os.getenv("AZURE_SQL_DRIVER")
 }
-endpoint = "https://idp-claims-4657894.cognitiveservices.azure.com/"
+# Endpoints can be pointed at the local fakes (python -m app.fakes) for load tests
+endpoint = os.getenv("DOC_INTELLIGENCE_ENDPOINT", "https://idp-claims-4657894.cognitiveservices.azure.com/")
 key = os.environ.get("doc_intelligence_key")
 
 # def get_azure_sql_connection():
@@ -37,4 +38,109 @@ key = os.environ.get("doc_intelligence_key")
 #     return pyodbc.connect(conn_str)
 
 MY_SAS_URL = os.getenv("sas_url")
-CONTAINER_NAME = os.getenv("container_name")
\ No newline at end of file
+CONTAINER_NAME = os.getenv("container_name")
+
+# ============================================================
+# DOCUMENT JOB QUEUE
+# ============================================================
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# ============================================================
+# OCR
+# ============================================================
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "8"))
+# Worker processes for page preprocessing; 0 runs it on the calling thread
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# "per_page" sends one analyze request per page, "multipage" packs all pages into one TIFF request
+OCR_MODE = os.getenv("OCR_MODE", "per_page")
+# Page payload encoder: "png", "jpeg" or "tiff_g4"
+OCR_ENCODER = os.getenv("OCR_ENCODER", "png")
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+# Pages scanned at or above this DPI skip the 2x upscale; 0 always upscales
+OCR_UPSCALE_MAX_DPI = int(os.getenv("OCR_UPSCALE_MAX_DPI", "0"))
+# On-disk OCR result cache keyed by page payload hash
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join(BASE_DIR, "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# ============================================================
+# PDF EXTRACTION
+# ============================================================
+# Pages whose text layer has fewer characters than this are OCR'd
+PDF_MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "25"))
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "200"))
+# Scanned PDF pages rendered and OCR'd per window (about 11 MB per page at 200 DPI)
+PDF_OCR_WINDOW = int(os.getenv("PDF_OCR_WINDOW", "4"))
+
+# ============================================================
+# LLM
+# ============================================================
+# Estimated input-token budget for document text in LLM prompts; 0 sends the full text
+LLM_TOKEN_BUDGET = int(os.getenv("LLM_TOKEN_BUDGET", "6000"))
+# "separate" makes a classification call and a summary call, "combined" makes one structured call
+# (only "combined" asks the model for a confidence, recorded in ai_confidence_score)
+LLM_MODE = os.getenv("LLM_MODE", "separate")
+LLM_CALL_WORKERS = int(os.getenv("LLM_CALL_WORKERS", "16"))
+# Seconds to wait for each call before falling back
+CLASSIFICATION_TIMEOUT = float(os.getenv("CLASSIFICATION_TIMEOUT", "60"))
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "60"))
+
+# ============================================================
+# LOCAL CLASSIFIER
+# ============================================================
+# Fast local classification; the LLM is only asked when confidence is below the threshold.
+# Off by default: enable only once document_logs holds enough corrected documents per category
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "false").lower() == "true"
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.9"))
+LOCAL_CLASSIFIER_TEMPERATURE = float(os.getenv("LOCAL_CLASSIFIER_TEMPERATURE", "0.05"))
+LOCAL_CLASSIFIER_RETRAIN_SECONDS = int(os.getenv("LOCAL_CLASSIFIER_RETRAIN_SECONDS", "3600"))
+# Labelled cases ([{"text", "expected_doc_type"}]); never the benchmark's own file, or it grades its training data
+LOCAL_CLASSIFIER_TRAINING_FILE = os.getenv("LOCAL_CLASSIFIER_TRAINING_FILE", "local_classifier_training.json")
+BENCHMARK_DATA_FILE = os.getenv("BENCHMARK_DATA_FILE", "benchmark_data.json")
+# A local label is only trusted when its category has at least this many training documents
+LOCAL_CLASSIFIER_MIN_SAMPLES = int(os.getenv("LOCAL_CLASSIFIER_MIN_SAMPLES", "20"))
+# Extracted text kept per document_logs row, for training the local classifier
+STORED_TEXT_MAX_CHARS = int(os.getenv("STORED_TEXT_MAX_CHARS", "20000"))
+# Connection pool per pooled LLM client
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "120"))
+# Per-key Gemini budgets used by the key pool scheduler
+GEMINI_KEY_RPM = int(os.getenv("GEMINI_KEY_RPM", "10"))
+GEMINI_KEY_TPM = int(os.getenv("GEMINI_KEY_TPM", "250000"))
+KEY_COOLDOWN_SECONDS = float(os.getenv("KEY_COOLDOWN_SECONDS", "60"))
+KEY_POOL_MAX_WAIT_SECONDS = float(os.getenv("KEY_POOL_MAX_WAIT_SECONDS", "30"))
+# Provider routing: circuit breakers and hedged requests
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_HEDGE_CLASSIFICATION = os.getenv("LLM_HEDGE_CLASSIFICATION", "false").lower() == "true"
+LLM_HEDGE_SUMMARY = os.getenv("LLM_HEDGE_SUMMARY", "false").lower() == "true"
+# Hedge delay is the primary's observed p95, or the default until there is data, capped at the max
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "5"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "15"))
+# Batched classification for short documents (backfills)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "20"))
+# Documents above this many tokens are classified on their own
+LLM_BATCH_MAX_DOC_TOKENS = int(os.getenv("LLM_BATCH_MAX_DOC_TOKENS", "1000"))
+# Upper bound on document tokens packed into one batch prompt
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "8000"))
+# Bulk reprocessing CLI (python -m app.reprocess)
+REPROCESS_CHECKPOINT_FILE = os.getenv("REPROCESS_CHECKPOINT_FILE", os.path.join(BASE_DIR, "reprocess_checkpoint.json"))
+# Service endpoint overrides; the Gemini one switches the client to REST transport
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://defaultresourcegroup-ccan-resource-0475.cognitiveservices.azure.com/")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+# Tracing: "none", "console" or "file" (TRACE_FILE, JSON lines; worker processes write TRACE_FILE with their pid)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.log")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "idp")
+# Email attachments processed concurrently across all documents
+ATTACHMENT_WORKERS = int(os.getenv("ATTACHMENT_WORKERS", "8"))
+# Streaming .eml parsing: attachments above this size are spooled to disk
+EML_SPOOL_MAX_BYTES = int(os.getenv("EML_SPOOL_MAX_BYTES", str(1024 * 1024)))
+EML_MAX_BODY_CHARS = int(os.getenv("EML_MAX_BODY_CHARS", "200000"))
+# Spreadsheet digests: token budget per workbook, rows sampled per sheet, columns kept per row
+SPREADSHEET_TOKEN_BUDGET = int(os.getenv("SPREADSHEET_TOKEN_BUDGET", "3000"))
+SPREADSHEET_SAMPLE_ROWS = int(os.getenv("SPREADSHEET_SAMPLE_ROWS", "25"))
+SPREADSHEET_MAX_COLUMNS = int(os.getenv("SPREADSHEET_MAX_COLUMNS", "50"))
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from prometheus_client import Counter
+
+# Deduplication metrics
+try:
+    DEDUP_COUNT = Counter('document_dedup_total', 'Document content-hash lookups', ['outcome'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    DEDUP_COUNT = REGISTRY._names_to_collectors['document_dedup_total']
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_bytes(data):
+    """Return the SHA-256 hex digest of in-memory content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func once per key at a time. Callers arriving while it runs wait for
+        and share its result. Returns (result, shared).
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+# Global single-flight group for document processing
+document_flight = SingleFlight()
@@ -0,0 +1,80 @@
+"""
+Document categories and identifying phrases used by the classification prompt.
+"""
+
+import difflib
+
+# Every label the classifier may return, as named in the classification prompt
+DOC_TYPES = [
+    "Policy Documents",
+    "Insurance Certificates",
+    "Customer Communications",
+    "First Notice of Loss (FNOL)",
+    "Proof of Loss",
+    "Investigation Reports",
+    "Vehicle Reports",
+    "ISO/Match Reports",
+    "Property Reports",
+    "Fraud Investigation Reports",
+    "Adjuster Reports",
+    "Police Reports",
+    "Arbitration",
+    "Summons",
+    "Legal and Demand Letters",
+    "Power of Attorney",
+    "Demand Packets",
+    "Settlement/Plea Agreements",
+    "Medical Bills",
+    "Medical Records",
+    "Explanation of Benefits (EOB)",
+    "Authorizations",
+    "Repair Estimates and Invoices",
+    "Claims Reserves and Payment",
+    "Subrogation and Recovery Documents",
+    "Photographs and Videos",
+    "Appraisal Reports",
+    "Other Reports",
+]
+
+FALLBACK_DOC_TYPE = "Other Reports"
+
+# Stored for documents whose analysis failed; such rows are never reused by deduplication
+FAILED_DOC_TYPE = "error"
+SUMMARY_FALLBACK = "Unable to generate summary"
+
+# Key identifying phrases per category, as listed in the classification prompt
+KEY_PHRASES = {
+    "Policy Documents": ["policy number", "coverage limits", "deductible", "premium", "policyholder", "effective date", "terms and conditions"],
+    "Proof of Loss": ["notice of loss", "claim number", "date of loss", "extent of damage", "sworn statement", "claimant signature"],
+    "Police Reports": ["incident report", "case number", "officer badge", "citation", "violation", "arrested", "police department"],
+    "Medical Records": ["patient", "diagnosis", "treatment", "physician", "hospital", "medical history", "prescription"],
+    "Repair Estimates": ["estimate", "labor costs", "parts", "repair", "invoice", "service provider", "total cost"],
+    "Investigation Reports": ["investigation findings", "analysis", "assessment", "liability determination", "evidence review"],
+    "Legal Documents": ["subpoena", "court order", "attorney", "legal proceeding", "settlement", "power of attorney"],
+}
+
+
+# Key-phrase groups whose name is not itself a category
+KEY_PHRASE_DOC_TYPES = {"Repair Estimates": "Repair Estimates and Invoices", "Legal Documents": "Legal and Demand Letters"}
+
+
+def normalize_doc_type(label):
+    """Map a model label onto the known category list. Returns (doc_type, matched)."""
+    cleaned = str(label or "").strip().strip('"*').strip()
+    by_lower = {doc_type.lower(): doc_type for doc_type in DOC_TYPES}
+    if cleaned.lower() in by_lower:
+        return by_lower[cleaned.lower()], True
+    close = difflib.get_close_matches(cleaned.lower(), list(by_lower.keys()), n=1, cutoff=0.8)
+    if close:
+        return by_lower[close[0]], True
+    return FALLBACK_DOC_TYPE, False
+
+
+def all_key_phrases():
+    """Flat, de-duplicated list of every key phrase."""
+    phrases = []
+    for category_phrases in KEY_PHRASES.values():
+        for phrase in category_phrases:
+            if phrase not in phrases:
+                phrases.append(phrase)
+    return phrases
@@ -1,4 +1,10 @@
+import io
 import os
+import time
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from PIL import Image, ImageSequence
 import re
 from bs4 import BeautifulSoup
@@ -11,21 +17,45 @@ import pandas as pd
 import numpy as np
 import extract_msg
 from app.helpers.config import BASE_DIR
-from email import policy
-from email.parser import BytesParser
-from app import process
-from PyPDF2 import PdfReader
+from app.helpers.mime_stream import parse_eml
+from app.helpers.spreadsheet import read_spreadsheet
+import fitz  # PyMuPDF
 import regex as re
 # import google.generativeai as genai 
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
 from app.helpers.config import endpoint as AZURE_ENDPOINT, key as AZURE_KEY
+from app.helpers.config import OCR_MAX_CONCURRENCY, PREPROCESS_WORKERS, OCR_MODE
+from app.helpers.config import OCR_ENCODER, OCR_JPEG_QUALITY, OCR_UPSCALE_MAX_DPI
+from app.helpers.config import PDF_MIN_TEXT_CHARS, PDF_OCR_DPI, PDF_OCR_WINDOW
+from app.helpers.preprocessing import preprocessImage, pil_to_bytes, prepare_page, preprocess_page, pack_pages_tiff, warm_up
+from app.helpers.ocr_cache import ocr_cache, cache_key
+from app.helpers.timings import current_timer, record_page, timed_stage
+from app.helpers.tracing import traced, start_span, set_attributes, propagate, inject_context, run_traced
+from prometheus_client import Counter, Histogram
 
 doc_client = DocumentIntelligenceClient(
     endpoint=AZURE_ENDPOINT,
     credential=AzureKeyCredential(AZURE_KEY)
 )
 
+# OCR metrics
+try:
+    OCR_DOCUMENT_TIME = Histogram('ocr_document_seconds', 'OCR wall-clock time per image document', ['mode'])
+    OCR_PAYLOAD_BYTES = Histogram(
+        'ocr_payload_bytes', 'Encoded OCR payload size per request', ['encoder'],
+        buckets=(16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+    )
+    OCR_ENCODE_TIME = Histogram('ocr_encode_seconds', 'Time spent encoding an OCR payload', ['encoder'])
+    PDF_PAGE_COUNT = Counter('pdf_pages_total', 'PDF pages extracted', ['layer'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    OCR_DOCUMENT_TIME = REGISTRY._names_to_collectors['ocr_document_seconds']
+    OCR_PAYLOAD_BYTES = REGISTRY._names_to_collectors['ocr_payload_bytes']
+    OCR_ENCODE_TIME = REGISTRY._names_to_collectors['ocr_encode_seconds']
+    PDF_PAGE_COUNT = REGISTRY._names_to_collectors['pdf_pages_total']
+
 
 # def get_gemini_response(user_message):
     
@@ -43,33 +73,13 @@ doc_client = DocumentIntelligenceClient(
 #         return f"Error: {str(e)}"
 
 
-def pil_to_bytes(image):
-    from io import BytesIO
-    buf = BytesIO()
-    Image.fromarray(image).save(buf, format="PNG")
-    return buf.getvalue()
-
-def read_eml(file_path, chars_per_page=1000):
-    # Read and parse the EML file
-    with open(file_path, 'rb') as f:
-        msg = BytesParser(policy=policy.default).parse(f)
-
-    # Try to extract plain text
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            if content_type == 'text/plain':
-                text = part.get_content()
-                break
-        else:
-            text = msg.get_body(preferencelist=('plain')).get_content()
-    else:
-        text = msg.get_content()
-
-    # Split into "pages" based on character count
-    pages = [text[i:i+chars_per_page] for i in range(0, len(text), chars_per_page)]
-
-    return pages
+def read_eml(eml_source, keep_attachments=True):
+    """
+    Body text and attachments of an .eml (a path or a binary file object),
+    parsed as a stream. Attachments are SpooledAttachment objects that the
+    caller must close().
+    """
+    return parse_eml(eml_source, keep_attachments)
 
 # Usage
 # file_path = "C:\\Users\\ShashankTudum\\OneDrive - ValueMomentum, Inc\\Documents\\IDP-LLM\\claim_submission.eml"  # Path to your EML file
@@ -81,14 +91,53 @@ def read_eml(file_path, chars_per_page=1000):
 
 
 
-def pdf_to_text(pdf_path):
-        """code to read the pdf data from the given file"""
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
+def render_pdf_page(page, dpi):
+    """Render a PyMuPDF page to a PIL image tagged with its DPI."""
+    pix = page.get_pixmap(dpi=dpi)
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+@traced("extraction.pdf_to_text")
+def pdf_to_text(pdf_path, data=None):
+    """
+    Read the PDF text layer page by page with PyMuPDF.
+    Pages without usable text (scans) are rendered and OCR'd in parallel, at
+    most PDF_OCR_WINDOW pages at a time, so a long scan never holds more than
+    one window of rendered pages in memory.
+    data, when given, is the PDF content and pdf_path only names it.
+    """
+    pages = []
+    window = []
+    scanned_count = 0
+
+    def ocr_window():
+        numbers = [number for number, _ in window]
+        images = [image for _, image in window]
+        # Drop the window's references before OCR so each image is freed with its batch
+        window.clear()
+        for number, text in zip(numbers, ocr_pages(images)):
+            pages[number] = text
+
+    with (fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(pdf_path)) as doc:
+        for page in doc:
+            text = page.get_text("text")
+            pages.append(text)
+            if len(text.strip()) < PDF_MIN_TEXT_CHARS:
+                scanned_count += 1
+                window.append((page.number, render_pdf_page(page, PDF_OCR_DPI)))
+                if len(window) >= PDF_OCR_WINDOW:
+                    ocr_window()
+        if window:
+            ocr_window()
+
+    set_attributes(**{"pdf.pages": len(pages), "pdf.scanned_pages": scanned_count})
+    PDF_PAGE_COUNT.labels(layer='text').inc(len(pages) - scanned_count)
+    if scanned_count:
+        PDF_PAGE_COUNT.labels(layer='ocr').inc(scanned_count)
+
+    return "\n".join(pages)
 
 # def cluster_paragraphs(paragraphs, model_name='all-MiniLM-L6-v2', relax_pages=1):
 #     """Cluster paragraphs sequentially with boundary relaxation"""
@@ -169,25 +218,6 @@ def extract_key_value_pairs(lines, x_tolerance=50):
     return key_value_pairs
 
 
-def preprocessImage(image):
-    # Ensure image is in RGB mode
-    if image.mode != "RGB":
-        image = image.convert("RGB")
-
-    new_size = (image.width * 2, image.height * 2)
-    image_rescaled = image.resize(new_size, Image.Resampling.LANCZOS)
-    np_image_rescaled = np.array(image_rescaled)
-
-    gray_image = cv2.cvtColor(np_image_rescaled, cv2.COLOR_RGB2GRAY)  # Use RGB, not BGR
-
-    blurred_image = cv2.GaussianBlur(gray_image, (3, 3), 0)
-    binary_image = cv2.adaptiveThreshold(
-        blurred_image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY, 37, 1
-    )
-    return binary_image
-
-
 def group_words_into_lines(words, y_tolerance=10):
     # Sort words by their vertical position
     words = sorted(words, key=lambda w: w['center_y'])
@@ -255,25 +285,56 @@ def extract_information(hocr_content):
     return key_value_pairs
 
 
+@traced("ocr.analyze_pages")
+def analyze_pages(image, timeout=30, model_id="prebuilt-read"):
+    """Run prebuilt-read on a (possibly multi-page) image and return the text of each page in order."""
+    set_attributes(**{"ocr.model_id": model_id, "ocr.payload_bytes": len(image)})
+    key = cache_key(image, model_id) if ocr_cache else None
+    if key:
+        try:
+            cached = ocr_cache.get(key)
+            if cached is not None:
+                set_attributes(**{"ocr.cache_hit": True})
+                return cached
+        except Exception as e:
+            print(f"OCR cache lookup failed: {str(e)}")
+
+    pages = _analyze_pages_remote(image, timeout, model_id)
+
+    # Only cache results that produced text, empty ones are retried next time
+    if key and any(page.strip() for page in pages):
+        try:
+            ocr_cache.put(key, pages)
+        except Exception as e:
+            print(f"OCR cache write failed: {str(e)}")
+    return pages
+
+
+def _analyze_pages_remote(image, timeout, model_id):
+    poller = doc_client.begin_analyze_document(
+        model_id=model_id,
+        body=image
+    )
+
+    result = poller.result(timeout=timeout)
+
+    page_count = max([page.page_number for page in result.pages], default=0)
+    pages = [[] for _ in range(page_count)]
+    for page in result.pages:
+        for line in page.lines or []:
+            pages[page.page_number - 1].append(line.content)
+
+    return ["\n".join(lines) for lines in pages]
+
+
+@traced("ocr.extract_text")
 def extract_text(image, config, timeout=30):
     """
     Azure OCR replacement for pytesseract.image_to_string
     image_bytes: bytes (open(file, 'rb').read())
     """
     try:
-        poller = doc_client.begin_analyze_document(
-            model_id="prebuilt-read",
-            body=image
-        )
-
-        result = poller.result(timeout=timeout)
-
-        lines = []
-        for page in result.pages:
-            for line in page.lines:
-                lines.append(line.content)
-
-        return "\n".join(lines)
+        return "\n".join(page for page in analyze_pages(image, timeout) if page)
 
     except Exception as e:
         print(f"Basic text extraction failed: {str(e)}")
@@ -312,13 +373,51 @@ def tif_process(file_path):
         return [page.copy() for page in ImageSequence.Iterator(img)]
     
     
+_preprocess_pool = None
+_preprocess_pool_lock = threading.Lock()
+
+
+def get_preprocess_pool():
+    """Lazily start the warm preprocessing process pool. Returns None when disabled."""
+    global _preprocess_pool
+    if PREPROCESS_WORKERS <= 0:
+        return None
+    with _preprocess_pool_lock:
+        if _preprocess_pool is None:
+            # spawn, not fork: the server process already runs threads. Workers import
+            # only what the submitted functions need (preprocessing, tracing, config);
+            # the launcher must keep app startup under its __main__ guard (see run_server.py)
+            _preprocess_pool = ProcessPoolExecutor(
+                max_workers=PREPROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+            # Start every worker now so the first pages do not pay the import cost
+            for future in [_preprocess_pool.submit(int) for _ in range(PREPROCESS_WORKERS)]:
+                future.result()
+        return _preprocess_pool
+
+
+def preprocess_page_bytes(image):
+    """Preprocess and encode a page in the process pool, falling back to this thread."""
+    args = (image, OCR_ENCODER, OCR_JPEG_QUALITY, OCR_UPSCALE_MAX_DPI)
+    pool = get_preprocess_pool()
+    if pool is None:
+        payload, encode_seconds = preprocess_page(*args)
+    else:
+        # The worker process continues this trace from the carrier
+        payload, encode_seconds = pool.submit(run_traced, inject_context(), "preprocess_page", preprocess_page, *args).result()
+    OCR_PAYLOAD_BYTES.labels(encoder=OCR_ENCODER).observe(len(payload))
+    OCR_ENCODE_TIME.labels(encoder=OCR_ENCODER).observe(encode_seconds)
+    return payload
+
+
 def batch_process_ocr_text_extraction(batch_data):
     result = []
     idx, images = batch_data
     for image in images:
         try:
-            final_image = preprocessImage(image)
-            image_bytes = pil_to_bytes(final_image)
+            image_bytes = preprocess_page_bytes(image)
             config = '--oem 3 --psm 12'
             # Try with initial short timeout
             extracted_text = extract_text(image_bytes, config, timeout=30)
@@ -332,6 +431,65 @@ def batch_process_ocr_text_extraction(batch_data):
     return idx, result
 
 
+# Shared pool so concurrent documents cannot exceed the OCR fan-out between them
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_MAX_CONCURRENCY, thread_name_prefix="ocr")
+
+
+def ocr_pages(images):
+    """OCR pages concurrently and return their text in page order."""
+    # Pool threads do not see the caller's context, so hand them the timer explicitly
+    timer = current_timer()
+
+    def ocr_page(batch):
+        start = time.perf_counter()
+        try:
+            with start_span("ocr.page", {"page.index": batch[0]}):
+                return batch_process_ocr_text_extraction(batch)
+        finally:
+            record_page(time.perf_counter() - start, timer)
+
+    if len(images) < 2:
+        return ocr_page([0, images])[1]
+    batches = [[idx, [image]] for idx, image in enumerate(images)]
+    # map() yields results in submission order, so page order is preserved
+    return [texts[0] for _, texts in ocr_executor.map(propagate(ocr_page), batches)]
+
+
+def ocr_pages_multipage(images):
+    """
+    OCR all pages with a single Document Intelligence request.
+    Pages are preprocessed in the pool, packed into one multi-page TIFF and
+    result.pages is split back into per-page text.
+    """
+    pool = get_preprocess_pool()
+    encode_start = time.perf_counter()
+    if pool is None:
+        arrays = [prepare_page(image, OCR_UPSCALE_MAX_DPI) for image in images]
+        packed = pack_pages_tiff(arrays)
+    else:
+        carrier = inject_context()
+        arrays = list(pool.map(
+            partial(run_traced, carrier, "prepare_page", prepare_page), images, [OCR_UPSCALE_MAX_DPI] * len(images)
+        ))
+        packed = pool.submit(run_traced, carrier, "pack_pages_tiff", pack_pages_tiff, arrays).result()
+    OCR_PAYLOAD_BYTES.labels(encoder="multipage_tiff_g4").observe(len(packed))
+    OCR_ENCODE_TIME.labels(encoder="multipage_tiff_g4").observe(time.perf_counter() - encode_start)
+
+    # One request now carries every page, so allow it proportionally more time
+    timeout = 30 + 5 * len(images)
+    try:
+        with timed_stage("ocr_multipage"):
+            pages = analyze_pages(packed, timeout=timeout)
+    except Exception as e:
+        print(f"Multi-page OCR failed: {str(e)}")
+        pages = []
+
+    if not any(page.strip() for page in pages):
+        # Nothing usable came back, fall back to one request per page
+        return ocr_pages(images)
+
+    pages = pages[:len(images)] + [""] * (len(images) - len(pages))
+    return pages
 
 
 
@@ -350,20 +508,72 @@ def count_files_in_folder(folder_path):
     return file_count
 
 
+# Extensions operation() can extract text from, lower-case; matching ignores case
+SUPPORTED_EXTENSIONS = (".tiff", ".jpeg", ".jpg", ".png", ".xls", ".xlsx", ".xlsm", ".docx", ".pdf", ".eml", ".msg")
+
+
+def is_supported(file_name):
+    return os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def read_msg(msg_source):
+    """
+    Body text and attachments of an Outlook .msg (a path or the file's bytes).
+    Attachments come back in memory as (name, bytes); hidden inline images,
+    embedded messages and unreadable attachments are left out.
+    """
+    msg = extract_msg.Message(msg_source)
+    try:
+        text = msg.body or ""
+        attachments = []
+        for attachment in msg.attachments:
+            name = attachment.longFilename or attachment.shortFilename
+            if not name or getattr(attachment, "hidden", False):
+                continue
+            data = attachment.data
+            if isinstance(data, bytes) and data:
+                attachments.append((os.path.basename(name), data))
+    finally:
+        msg.close()
+    return text, attachments
+
+
+@traced("extraction.extract_with_attachments")
+def extract_with_attachments(file_path, source, data=None):
+    """
+    operation() for any file, plus the attachments of email containers as
+    (name, content): bytes for .msg, a SpooledAttachment for .eml.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".msg":
+        return read_msg(data if data is not None else file_path)
+    if extension == ".eml":
+        text, attachments = read_eml(io.BytesIO(data) if data is not None else file_path)
+        return text, [(attachment.name, attachment) for attachment in attachments]
+    return operation(file_path, source, data), []
+
+
 # Start timer
-def operation(file_path,source):
-    
+@traced("extraction.operation")
+def operation(file_path,source,data=None):
+    """
+    Extract text from a file. With data (the file's bytes) nothing is read from
+    disk and file_path only supplies the name and extension.
+    """
+    file_obj = io.BytesIO(data) if data is not None else file_path
     
-    extension = os.path.splitext(file_path)[1]
+    extension = os.path.splitext(file_path)[1].lower()
+    set_attributes(**{"file.name": os.path.basename(file_path), "file.extension": extension, "source": source})
     # doc_types=["Litigation","Police Report","Medical","Demand Letter","Claims Database","Arbitration","Other"]
     if extension  in [".tiff",".jpeg",".jpg",".png"]:
-        images = tif_process(file_path)
+        images = tif_process(file_obj)
         page_count=len(images)
-        # OCR processing directly
-        extracted_text = []
-        for image in images:
-            text = batch_process_ocr_text_extraction(batch_data=[0, [image]])  # Wrap image in a list
-            extracted_text.append(text)
+        # OCR pages concurrently, results come back in page order
+        with OCR_DOCUMENT_TIME.labels(mode=OCR_MODE).time():
+            if OCR_MODE == "multipage" and page_count > 1:
+                extracted_text = ocr_pages_multipage(images)
+            else:
+                extracted_text = ocr_pages(images)
         # print(extracted_text)
         if page_count < 2:
             grouped_texts = extracted_text
@@ -380,72 +590,25 @@ def operation(file_path,source):
         # ]
         text=grouped_texts
         # print(text)
-    elif extension in [".xls",".XLS"]:
-        text=pd.read_excel(file_path,engine="xlrd")
+    elif extension in [".xls",".xlsx",".xlsm"]:
+        # Digest of headers, column types, sampled rows and totals, read row by row
+        text = read_spreadsheet(file_obj, extension)
     elif extension in [".docx"]:
-        text = docx2txt.process(file_path)
+        text = docx2txt.process(file_obj)
         
     elif extension in [".pdf"]:
         
-        text = pdf_to_text(file_path)
+        text = pdf_to_text(file_path, data)
         
 
  
         
     elif extension in [".eml"]:
-        text=""
-        pages = read_eml(file_path)
-        for i, page in enumerate(pages, start=1):
-            text=text+page
+        # Attachments are returned by extract_with_attachments, not processed here
+        text, _ = read_eml(file_obj, keep_attachments=False)
     elif extension in [".msg"]:
-        # output_folder = 'C:\\Users\\ShashankTudum\\OneDrive - ValueMomentum, Inc\\Documents\\IDP-LLM\\msg_attachments'
-        output_folder = os.path.join(BASE_DIR, 'msg_attachments')
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-        msg = extract_msg.Message(file_path)
-        msg_sender = msg.sender
-        msg_date = msg.date
-        msg_subj = msg.subject
-        text = msg.body
-
-        # Get folder name from the msg filename (without extension)
-        msg_name = os.path.splitext(os.path.basename(file_path))[0]
-        msg_folder = os.path.join(output_folder, msg_name)
-        print("msg_folder:", msg_folder)
-
-        # Make sure the folder exists
-        if not os.path.exists(msg_folder):
-            os.makedirs(msg_folder)
-
-        # Save each attachment inside this folder
-        for attachment in msg.attachments:
-            if attachment.longFilename:
-                attachment_filename, extension = os.path.splitext(attachment.longFilename)
-
-                # Create a consistent filename (no timestamp to avoid duplicates)
-                new_filename = f"{msg_name}{attachment_filename}{extension}"
-                save_path = os.path.join(msg_folder, new_filename)
-
-                if not os.path.exists(save_path):
-                    attachment.save(customPath=msg_folder, customFilename=new_filename)
-                    print(f"Saved attachment: {new_filename}")
-                else:
-                    print(f"Skipped duplicate attachment: {new_filename}")
-            else:
-                print("Skipping attachment with None filename.")
-
-        msg.close()
-
-        print('Processed file:', file_path)
-        print('Sender:', msg_sender)
-        print('Sent On:', msg_date)
-        print('Subject:', msg_subj)
-        print('Body:', text)
-        file_count=count_files_in_folder(msg_folder)
-        if file_count>0:
-            for file in os.listdir(msg_folder):
-                full_path = os.path.join(msg_folder, file)
-                process.process_file(full_path,source=source) 
+        # Attachments are returned by extract_with_attachments, not processed here
+        text, _ = read_msg(data if data is not None else file_path)
 
     return text
 
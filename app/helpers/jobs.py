@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Counter, Gauge
+
+from app.helpers.config import JOB_WORKERS, JOB_HISTORY_LIMIT
+from app.helpers.logger import logger
+from app.helpers.tracing import propagate
+
+# Job queue metrics
+try:
+    JOBS_SUBMITTED = Counter('document_jobs_submitted_total', 'Total document processing jobs submitted')
+    JOBS_FINISHED = Counter('document_jobs_finished_total', 'Total document processing jobs finished', ['status'])
+    JOBS_IN_FLIGHT = Gauge('document_jobs_in_flight', 'Document processing jobs queued or running', ['state'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    JOBS_SUBMITTED = REGISTRY._names_to_collectors['document_jobs_submitted_total']
+    JOBS_FINISHED = REGISTRY._names_to_collectors['document_jobs_finished_total']
+    JOBS_IN_FLIGHT = REGISTRY._names_to_collectors['document_jobs_in_flight']
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobQueue:
+    """Bounded worker pool that runs document jobs off the request thread and tracks their state."""
+
+    def __init__(self, max_workers=4, history_limit=1000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="document-job")
+        self.history_limit = history_limit
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, job_id, func, *args, **kwargs):
+        """Register a job and schedule func(*args, **kwargs) on the worker pool."""
+        now = time.time()
+        with self.lock:
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "stage": QUEUED,
+                "stage_history": [{"stage": QUEUED, "at": now}],
+                "submitted_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._trim_history()
+        JOBS_SUBMITTED.inc()
+        JOBS_IN_FLIGHT.labels(state=QUEUED).inc()
+        # The job runs under the submitting request's trace context
+        self.executor.submit(propagate(self._run), job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        JOBS_IN_FLIGHT.labels(state=QUEUED).dec()
+        JOBS_IN_FLIGHT.labels(state=RUNNING).inc()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job["status"] = RUNNING
+                job["started_at"] = time.time()
+        self.set_stage(job_id, RUNNING)
+
+        try:
+            result = func(*args, **kwargs)
+            self._finish(job_id, COMPLETED, result=result)
+        except Exception as e:
+            logger.error("Document job failed", extra={
+                'extra_data': {
+                    "request_id": job_id,
+                    "event_type": "document_job_error",
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }
+            })
+            self._finish(job_id, FAILED, error=str(e))
+        finally:
+            JOBS_IN_FLIGHT.labels(state=RUNNING).dec()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job["status"] = status
+                job["stage"] = status
+                job["stage_history"].append({"stage": status, "at": now})
+                job["finished_at"] = now
+                job["result"] = result
+                job["error"] = error
+        JOBS_FINISHED.labels(status=status).inc()
+
+    def set_stage(self, job_id, stage):
+        """Record the stage a job has reached. No-op for ids that are not queued jobs."""
+        if job_id is None:
+            return
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["stage"] = stage
+            job["stage_history"].append({"stage": stage, "at": time.time()})
+
+    def get(self, job_id):
+        """Return a snapshot of the job state, or None if unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["stage_history"] = list(job["stage_history"])
+            return snapshot
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs once the history limit is exceeded
+        excess = len(self.jobs) - self.history_limit
+        if excess <= 0:
+            return
+        for job_id in list(self.jobs.keys()):
+            if excess <= 0:
+                break
+            if self.jobs[job_id]["status"] in (COMPLETED, FAILED):
+                del self.jobs[job_id]
+                excess -= 1
+
+
+# Global job queue instance
+job_queue = JobQueue(max_workers=JOB_WORKERS, history_limit=JOB_HISTORY_LIMIT)
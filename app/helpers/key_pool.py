@@ -0,0 +1,187 @@
+import re
+import time
+import threading
+from prometheus_client import Gauge, Counter
+
+from app.helpers.logger import logger
+
+# Key pool metrics
+try:
+    KEY_UTILIZATION = Gauge('llm_key_utilization_ratio', 'Share of the per-key budget in use', ['provider', 'key', 'budget'])
+    KEY_COOLING_DOWN = Gauge('llm_key_cooling_down', 'Whether a key is in rate-limit cooldown', ['provider', 'key'])
+    KEY_RATE_LIMITS = Counter('llm_key_rate_limits_total', 'Rate-limit responses per key', ['provider', 'key'])
+    KEY_WAIT_TIME = Counter('llm_key_wait_seconds_total', 'Time spent waiting for key headroom', ['provider'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    KEY_UTILIZATION = REGISTRY._names_to_collectors['llm_key_utilization_ratio']
+    KEY_COOLING_DOWN = REGISTRY._names_to_collectors['llm_key_cooling_down']
+    KEY_RATE_LIMITS = REGISTRY._names_to_collectors['llm_key_rate_limits_total']
+    KEY_WAIT_TIME = REGISTRY._names_to_collectors['llm_key_wait_seconds_total']
+
+
+class KeyPoolExhausted(Exception):
+    """No key had enough budget within the wait limit."""
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_seconds=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (after refill)."""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+
+class KeyState:
+    def __init__(self, key, label, rpm, tpm):
+        self.key = key
+        self.label = label
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+        self.consecutive_limits = 0
+
+    def headroom(self):
+        return min(self.requests.tokens / self.requests.capacity, self.tokens.tokens / self.tokens.capacity)
+
+
+def retry_after_seconds(error):
+    """Best-effort Retry-After from a provider exception, in seconds."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header) if hasattr(headers, "get") else None
+        if value:
+            try:
+                seconds = float(value)
+                return seconds / 1000 if header.endswith("-ms") else seconds
+            except ValueError:
+                pass
+    # Gemini reports the delay in the message / RetryInfo details
+    match = re.search(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1) or match.group(2))
+    return None
+
+
+def is_rate_limit_error(error):
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    message = str(error).lower()
+    return 'quota' in message or 'rate limit' in message or 'resource exhausted' in message or '429' in message
+
+
+class KeyPool:
+    """
+    Schedules requests across API keys by per-key RPM/TPM token buckets.
+    Each request goes to the key with the most headroom; rate-limited keys
+    cool down for Retry-After (or an exponential backoff) before reuse.
+    """
+
+    def __init__(self, provider, keys, rpm, tpm, cooldown_seconds=60.0, max_cooldown_seconds=600.0):
+        self.provider = provider
+        self.rpm = rpm
+        self.tpm = tpm
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.lock = threading.Lock()
+        self.states = []
+        self.set_keys(keys)
+
+    def set_keys(self, keys):
+        with self.lock:
+            existing = {state.key: state for state in self.states}
+            self.states = [
+                existing.get(key) or KeyState(key, f"key_{index + 1}", self.rpm, self.tpm)
+                for index, key in enumerate(keys)
+            ]
+
+    def __len__(self):
+        return len(self.states)
+
+    def acquire(self, estimated_tokens=0, max_wait=30.0):
+        """Reserve budget on the key with the most headroom, waiting up to max_wait seconds."""
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+        while True:
+            with self.lock:
+                if not self.states:
+                    raise KeyPoolExhausted(f"No {self.provider} API keys configured")
+                now = time.monotonic()
+                wall_now = time.time()
+                best = None
+                next_ready = float("inf")
+                for state in self.states:
+                    state.requests.refill(now)
+                    state.tokens.refill(now)
+                    if state.cooldown_until > wall_now:
+                        next_ready = min(next_ready, state.cooldown_until - wall_now)
+                        continue
+                    wait = max(state.requests.wait_time(1), state.tokens.wait_time(estimated_tokens))
+                    if wait > 0:
+                        next_ready = min(next_ready, wait)
+                        continue
+                    if best is None or state.headroom() > best.headroom():
+                        best = state
+                if best is not None:
+                    best.requests.tokens -= 1
+                    best.tokens.tokens -= min(estimated_tokens, best.tokens.capacity)
+                for state in self.states:
+                    self._publish(state)
+                if best is not None:
+                    if waited:
+                        KEY_WAIT_TIME.labels(provider=self.provider).inc(waited)
+                    return best
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                KEY_WAIT_TIME.labels(provider=self.provider).inc(waited)
+                raise KeyPoolExhausted(f"All {self.provider} API keys are at their rate limits")
+            pause = min(max(next_ready, 0.05), remaining, 1.0)
+            time.sleep(pause)
+            waited += pause
+
+    def report_success(self, state, estimated_tokens=0, actual_tokens=None):
+        """Settle the token reservation with actual usage and clear the backoff."""
+        with self.lock:
+            if actual_tokens is not None:
+                state.tokens.tokens -= actual_tokens - min(estimated_tokens, state.tokens.capacity)
+            state.consecutive_limits = 0
+            self._publish(state)
+
+    def report_rate_limited(self, state, retry_after=None):
+        """Put a key into cooldown after a rate-limit response."""
+        with self.lock:
+            state.consecutive_limits += 1
+            if retry_after is None:
+                retry_after = min(
+                    self.cooldown_seconds * (2 ** (state.consecutive_limits - 1)),
+                    self.max_cooldown_seconds
+                )
+            state.cooldown_until = time.time() + retry_after
+            # The provider says the budget is spent, whatever our buckets think
+            state.requests.tokens = 0
+            state.tokens.tokens = 0
+            self._publish(state)
+        KEY_RATE_LIMITS.labels(provider=self.provider, key=state.label).inc()
+        logger.warning(f"{self.provider} {state.label} rate limited, cooling down for {retry_after:.1f}s")
+
+    def _publish(self, state):
+        KEY_UTILIZATION.labels(provider=self.provider, key=state.label, budget='rpm').set(
+            1 - max(state.requests.tokens, 0) / state.requests.capacity
+        )
+        KEY_UTILIZATION.labels(provider=self.provider, key=state.label, budget='tpm').set(
+            1 - max(state.tokens.tokens, 0) / state.tokens.capacity
+        )
+        KEY_COOLING_DOWN.labels(provider=self.provider, key=state.label).set(
+            1 if state.cooldown_until > time.time() else 0
+        )
@@ -1,10 +1,25 @@
-from openai import AzureOpenAI
-import google.generativeai as genai 
+import json
+from app.helpers.llm_clients import get_azure_client, get_gemini_model
 import pandas as pd
 from dotenv import load_dotenv
 import os
 import time
 from prometheus_client import Counter, Histogram
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from app.helpers.llm_router import LLMRouter
+from app.helpers.config import LLM_TOKEN_BUDGET, LLM_MODE
+from app.helpers.config import LLM_CALL_WORKERS, CLASSIFICATION_TIMEOUT, SUMMARY_TIMEOUT
+from app.helpers.config import LOCAL_CLASSIFIER_ENABLED, LOCAL_CLASSIFIER_THRESHOLD
+from app.helpers.local_classifier import classify_locally
+from app.helpers.doc_types import DOC_TYPES, FAILED_DOC_TYPE, SUMMARY_FALLBACK, normalize_doc_type
+from app.helpers.text_selection import select_text, estimate_tokens
+from app.helpers.timings import current_timer, timed_stage, timed_call
+from app.helpers.tracing import traced, propagate
+from app.helpers.key_pool import KeyPool, is_rate_limit_error, retry_after_seconds
+from app.helpers.config import GEMINI_KEY_RPM, GEMINI_KEY_TPM, KEY_COOLDOWN_SECONDS, KEY_POOL_MAX_WAIT_SECONDS
+from app.helpers.config import LLM_HEDGE_CLASSIFICATION, LLM_HEDGE_SUMMARY, AZURE_OPENAI_ENDPOINT
+from app.helpers.config import LLM_BATCH_SIZE, LLM_BATCH_MAX_DOC_TOKENS, LLM_BATCH_TOKEN_BUDGET
 
 # API rotation state
 CURRENT_API_INDEX = 0
@@ -40,6 +55,9 @@ def get_next_api_key():
 
 # Initialize API keys
 load_api_keys()
+gemini_key_pool = KeyPool(
+    "gemini", API_KEYS, rpm=GEMINI_KEY_RPM, tpm=GEMINI_KEY_TPM, cooldown_seconds=KEY_COOLDOWN_SECONDS
+)
 load_dotenv()
 # AI metrics - use try/except to avoid duplicate registration
 try:
@@ -48,6 +66,7 @@ try:
     AI_TOKEN_COUNT = Counter('ai_tokens_total', 'Total AI tokens used', ['model', 'type'])
     AI_ERROR_COUNT = Counter('ai_errors_total', 'Total AI errors', ['model', 'error_type'])
     AI_CONFIDENCE_SCORE = Histogram('ai_confidence_score', 'AI model confidence scores', ['model', 'operation'])
+    AI_BATCH_DOCUMENTS = Counter('ai_batch_classification_documents_total', 'Documents classified through the batch API', ['outcome'])
 except ValueError:
     # Metrics already registered, get existing ones
     from prometheus_client import REGISTRY
@@ -56,6 +75,12 @@ except ValueError:
     AI_TOKEN_COUNT = REGISTRY._names_to_collectors['ai_tokens_total']
     AI_ERROR_COUNT = REGISTRY._names_to_collectors['ai_errors_total']
     AI_CONFIDENCE_SCORE = REGISTRY._names_to_collectors['ai_confidence_score']
+    AI_BATCH_DOCUMENTS = REGISTRY._names_to_collectors['ai_batch_classification_documents_total']
+SUMMARY_OUTPUT_TOKEN_ESTIMATE = 200
+
+# Shared pool for issuing LLM calls concurrently
+llm_executor = ThreadPoolExecutor(max_workers=LLM_CALL_WORKERS, thread_name_prefix="llm")
+
 # doc_types=pd.read_excel("Doc_type field configuration.xlsx",sheet_name="doc_types")["doc_types"].tolist()  
 def get_gemini_response(user_message):
     start_time = time.time()
@@ -76,8 +101,7 @@ def get_gemini_response(user_message):
             for key in os.environ.keys():
                 if 'gemini' in key.lower() or 'api' in key.lower():
                     print(f"  {key}")
-        genai.configure(api_key=api)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = get_gemini_model(api, 'gemini-2.5-flash')
         response = model.generate_content(f"You are a helpful assistant. User: {user_message}")
         
         # Track metrics
@@ -107,23 +131,41 @@ def extract_sql_query(text):
     else:
         return text
 
+AZURE_ENDPOINT = AZURE_OPENAI_ENDPOINT
+AZURE_DEPLOYMENT = "gpt-4.1-mini-312634"
+AZURE_API_VERSION = "2024-12-01-preview"
+
+
+def azure_chat_completion(messages, **kwargs):
+    """Call the Azure OpenAI chat deployment and return the raw response. Raises on failure."""
+    subscription_key = os.environ.get("AZURE_AI_API_KEY")
+    if not subscription_key:
+        raise RuntimeError("AZURE_OPENAI_KEY not found in environment variables")
+
+    client = get_azure_client(AZURE_ENDPOINT, subscription_key, AZURE_API_VERSION)
+
+    response = client.chat.completions.create(
+        messages=messages,
+        model=AZURE_DEPLOYMENT,
+        **kwargs
+    )
+
+    # Track Azure token usage
+    if hasattr(response, 'usage') and response.usage:
+        AI_TOKEN_COUNT.labels(model='azure', type='input').inc(response.usage.prompt_tokens)
+        AI_TOKEN_COUNT.labels(model='azure', type='output').inc(response.usage.completion_tokens)
+        AI_TOKEN_COUNT.labels(model='azure', type='total_input').inc(response.usage.prompt_tokens)
+        AI_TOKEN_COUNT.labels(model='azure', type='total_output').inc(response.usage.completion_tokens)
+
+    return response
+
+
 def get_azure_response(text):
     try:
-        endpoint = "https://defaultresourcegroup-ccan-resource-0475.cognitiveservices.azure.com/"
-        deployment = "gpt-4.1-mini-312634"
-        subscription_key = os.environ.get("AZURE_AI_API_KEY")
-        api_version = "2024-12-01-preview"
-
-        if not subscription_key:
+        if not os.environ.get("AZURE_AI_API_KEY"):
             return "Error: AZURE_OPENAI_KEY not found in environment variables"
 
-        client = AzureOpenAI(
-            api_version=api_version,
-            azure_endpoint=endpoint,
-            api_key=subscription_key,
-        )
-
-        response = client.chat.completions.create(
+        response = azure_chat_completion(
             messages=[
                 {
                     "role": "system",
@@ -135,27 +177,15 @@ def get_azure_response(text):
                 }
             ],
             max_tokens=1000,
-            temperature=0.7,
-            model=deployment
+            temperature=0.7
         )
 
-        # Track Azure token usage
-        if hasattr(response, 'usage') and response.usage:
-            AI_TOKEN_COUNT.labels(model='azure', type='input').inc(response.usage.prompt_tokens)
-            AI_TOKEN_COUNT.labels(model='azure', type='output').inc(response.usage.completion_tokens)
-            AI_TOKEN_COUNT.labels(model='azure', type='total_input').inc(response.usage.prompt_tokens)
-            AI_TOKEN_COUNT.labels(model='azure', type='total_output').inc(response.usage.completion_tokens)
-
         return response.choices[0].message.content
     except Exception as e:
         AI_ERROR_COUNT.labels(model='azure', error_type=type(e).__name__).inc()
         return f"Azure Error: {str(e)}" 
    
-def get_gemini_response_with_context(text):
-    start_time = time.time()
-    AI_REQUEST_COUNT.labels(model='gemini', operation='classification').inc()
-    
-    question_prompt_1=f"""You are an expert document classifier for insurance claims processing. Your task is to classify documents based solely on their textual content and meaning.
+CLASSIFICATION_INSTRUCTIONS = """You are an expert document classifier for insurance claims processing. Your task is to classify documents based solely on their textual content and meaning.
 
 ## DOCUMENT CLASSIFICATION CATEGORIES:
 
@@ -248,7 +278,11 @@ def get_gemini_response_with_context(text):
 
 ---
 
-## DOCUMENT TO CLASSIFY:
+"""
+
+
+def build_classification_prompt(text):
+    return f"""{CLASSIFICATION_INSTRUCTIONS}## DOCUMENT TO CLASSIFY:
 
 Document Text:
 {text}
@@ -257,68 +291,355 @@ Document Text:
 Based on the content analysis, classify this document as one of the specific document types listed above. Return only the exact document type name (e.g., "Police Reports", "First Notice of Loss (FNOL)", "Repair Estimates and Invoices", etc.).
 
 """
+
+COMBINED_RESPONSE_SCHEMA = {
+    "name": "document_analysis",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "doc_type": {"type": "string", "enum": DOC_TYPES},
+            "summary": {"type": "string"},
+            "confidence": {"type": "number"}
+        },
+        "required": ["doc_type", "summary", "confidence"],
+        "additionalProperties": False
+    }
+}
+
+
+def build_combined_prompt(text):
+    return f"""{CLASSIFICATION_INSTRUCTIONS}## DOCUMENT TO CLASSIFY:
+
+Document Text:
+{text}
+
+## RESPONSE FORMAT:
+Return a JSON object with:
+- "doc_type": the exact document type name, one of: {", ".join(DOC_TYPES)}
+- "summary": a concise 2-3 sentence summary of the document focusing on the key information and purpose
+- "confidence": your confidence in doc_type, from 0.0 to 1.0
+"""
+
+
+@traced("llm.get_combined_response")
+def get_combined_response(text):
+    """
+    Classify and summarize a document with one structured Azure OpenAI call.
+    Returns (doc_type, summary, confidence). Raises on failure or an invalid response.
+    """
+    start_time = time.time()
+    AI_REQUEST_COUNT.labels(model='azure', operation='combined').inc()
+
+    response = azure_chat_completion(
+        messages=[
+            {"role": "system", "content": "You are an expert document classifier for insurance claims processing."},
+            {"role": "user", "content": build_combined_prompt(text)}
+        ],
+        max_tokens=1000,
+        temperature=0,
+        response_format={"type": "json_schema", "json_schema": COMBINED_RESPONSE_SCHEMA}
+    )
+    AI_LATENCY.labels(model='azure', operation='combined').observe(time.time() - start_time)
+
+    payload = json.loads(response.choices[0].message.content)
+    doc_type, matched = normalize_doc_type(payload.get("doc_type"))
+    summary = str(payload.get("summary") or "").strip() or SUMMARY_FALLBACK
+    confidence = min(max(float(payload.get("confidence", 0.0)), 0.0), 1.0)
+    if not matched:
+        # A label outside the category list is not something the model was confident about
+        AI_ERROR_COUNT.labels(model='azure', error_type='UnknownDocType').inc()
+        confidence = 0.0
+
+    # Only the combined call reports a confidence, so ai_confidence_score stays empty in "separate" mode
+    AI_CONFIDENCE_SCORE.labels(model='azure', operation='combined').observe(confidence)
+    return doc_type, summary, confidence
+
+
+def build_batch_classification_prompt(texts):
+    documents = "\n\n".join(
+        f"=== DOCUMENT {number} ===\n{text}\n=== END DOCUMENT {number} ==="
+        for number, text in enumerate(texts, start=1)
+    )
+    return f"""{CLASSIFICATION_INSTRUCTIONS}## DOCUMENTS TO CLASSIFY:
+
+There are {len(texts)} documents below, each between numbered delimiters. Classify every document independently.
+
+{documents}
+
+## RESPONSE FORMAT:
+Return only a JSON array of exactly {len(texts)} strings, where element i is the exact document type name for DOCUMENT i+1 (e.g. ["Police Reports", "First Notice of Loss (FNOL)"]). No other text.
+
+"""
+
+
+def parse_batch_labels(content, expected):
+    """Parse the JSON array of labels from a batch response. Raises ValueError on any mismatch."""
+    cleaned = str(content or "").strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        cleaned = cleaned[cleaned.find("["):]
+    start, end = cleaned.find("["), cleaned.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("Batch response has no JSON array")
+    labels = json.loads(cleaned[start:end + 1])
+    if not isinstance(labels, list) or len(labels) != expected:
+        raise ValueError(f"Batch response has {len(labels) if isinstance(labels, list) else 'no'} labels, expected {expected}")
+    return [normalize_doc_type(label)[0] for label in labels]
+
+
+def _pack_batches(texts, batch_size):
+    """Split indexes of short documents into batches; long documents are returned separately."""
+    batches, singles = [], []
+    current, current_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if tokens > LLM_BATCH_MAX_DOC_TOKENS:
+            singles.append(index)
+            continue
+        if current and (len(current) >= batch_size or current_tokens + tokens > LLM_BATCH_TOKEN_BUDGET):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches, singles
+
+
+def _classify_single(text):
+    try:
+        return normalize_doc_type(classify_document(build_classification_prompt(text), CLASSIFICATION_TIMEOUT))[0]
+    except Exception as e:
+        print(f"Classification failed: {str(e)}")
+        AI_ERROR_COUNT.labels(model='router', error_type=type(e).__name__).inc()
+        return FAILED_DOC_TYPE
+
+
+def _classify_batch_chunk(texts):
+    """Classify one packed batch, falling back to one call per document if the labels do not line up."""
+    if len(texts) > 1:
+        try:
+            content = classify_document(build_batch_classification_prompt(texts), CLASSIFICATION_TIMEOUT)
+            labels = parse_batch_labels(content, len(texts))
+            AI_BATCH_DOCUMENTS.labels(outcome='batched').inc(len(texts))
+            return labels
+        except Exception as e:
+            print(f"Batch classification failed, classifying {len(texts)} documents individually: {str(e)}")
+            AI_ERROR_COUNT.labels(model='router', error_type='BatchMismatch' if isinstance(e, ValueError) else type(e).__name__).inc()
+    AI_BATCH_DOCUMENTS.labels(outcome='single').inc(len(texts))
+    return list(llm_executor.map(propagate(_classify_single), texts))
+
+
+@traced("llm.classify_batch")
+def classify_batch(texts, batch_size=None):
+    """
+    Classify many short documents, packing up to batch_size of them into one
+    prompt so the instruction block is paid once per batch instead of once per
+    document. Long documents are classified individually. Returns doc types in
+    input order, FAILED_DOC_TYPE for documents no provider could classify.
+    """
+    texts = [select_text(str(text or ""), LLM_TOKEN_BUDGET)[0] for text in texts]
+    batches, singles = _pack_batches(texts, max(1, batch_size or LLM_BATCH_SIZE))
+    results = [None] * len(texts)
+
+    # Batches get their own short-lived pool: their fallbacks fan out on llm_executor,
+    # which must not be the pool the batches themselves are waiting in
+    with ThreadPoolExecutor(max_workers=max(1, min(len(batches), LLM_CALL_WORKERS)), thread_name_prefix="llm-batch") as batch_pool:
+        chunk_futures = {
+            batch_pool.submit(propagate(_classify_batch_chunk), [texts[index] for index in batch]): batch
+            for batch in batches
+        }
+        if singles:
+            AI_BATCH_DOCUMENTS.labels(outcome='single').inc(len(singles))
+            for index, label in zip(singles, llm_executor.map(propagate(_classify_single), [texts[index] for index in singles])):
+                results[index] = label
+        for future, batch in chunk_futures.items():
+            for index, label in zip(batch, future.result()):
+                results[index] = label
+    return results
+
+
+@traced("llm.get_gemini_response_with_context")
+def get_gemini_response_with_context(text):
+    """
+    Returns (doc_type, summary). When classification fails on every provider
+    doc_type is FAILED_DOC_TYPE; when only the summary fails it is SUMMARY_FALLBACK.
+    """
+    start_time = time.time()
+    AI_REQUEST_COUNT.labels(model='gemini', operation='classification').inc()
+    
+    # Calls below run on pool threads, which record into this document's timer explicitly
+    timer = current_timer()
+    
+    # Obvious documents are classified locally; only the summary needs the LLM
+    if LOCAL_CLASSIFIER_ENABLED:
+        with timed_stage("local_classification", timer):
+            local_doc_type, _ = classify_locally(text, LOCAL_CLASSIFIER_THRESHOLD)
+        if local_doc_type:
+            text, _ = select_text(text, LLM_TOKEN_BUDGET)
+            try:
+                with timed_stage("summary", timer):
+                    summary = summarize_document(build_summary_prompt(text), SUMMARY_TIMEOUT)
+            except Exception as e:
+                print(f"Summary failed: {str(e)}")
+                AI_ERROR_COUNT.labels(model='gemini', error_type=type(e).__name__).inc()
+                summary = SUMMARY_FALLBACK
+            AI_LATENCY.labels(model='local', operation='classification').observe(time.time() - start_time)
+            return local_doc_type, summary
+    
+    # Keep the prompts within the token budget
+    text, _ = select_text(text, LLM_TOKEN_BUDGET)
     
-    summary_prompt = f"""Provide a concise 2-3 sentence summary of this document focusing on the key information and purpose:
+    if LLM_MODE == "combined":
+        try:
+            with timed_stage("combined", timer):
+                doc_type, summary, _ = get_combined_response(text)
+            return doc_type, summary
+        except Exception as e:
+            # Fall back to the separate classification and summary calls
+            print(f"Combined LLM call failed, using separate calls: {str(e)}")
+            AI_ERROR_COUNT.labels(model='azure', error_type=type(e).__name__).inc()
+    
+    question_prompt_1 = build_classification_prompt(text)
+    
+    summary_prompt = build_summary_prompt(text)
+    
+    # Classification and summary run concurrently with independent timeouts, each routed across providers
+    calls_started = time.time()
+    classification_future = llm_executor.submit(
+        propagate(timed_call), "classification", classify_document, question_prompt_1, CLASSIFICATION_TIMEOUT, timer=timer
+    )
+    summary_future = llm_executor.submit(
+        propagate(timed_call), "summary", summarize_document, summary_prompt, SUMMARY_TIMEOUT, timer=timer
+    )
+    
+    # Failures stay recognisable so they are neither stored as results nor reused
+    doc_type = FAILED_DOC_TYPE
+    summary = SUMMARY_FALLBACK
+    
+    try:
+        doc_type = normalize_doc_type(classification_future.result(timeout=CLASSIFICATION_TIMEOUT))[0]
+    except Exception as e:
+        print(f"Classification failed: {str(e)}")
+        AI_ERROR_COUNT.labels(model='router', error_type=type(e).__name__).inc()
+    
+    try:
+        # Both calls started together, so only wait out what is left of the summary timeout
+        remaining = max(0.0, SUMMARY_TIMEOUT - (time.time() - calls_started))
+        summary = summary_future.result(timeout=remaining)
+    except Exception as e:
+        print(f"Summary failed: {str(e)}")
+        AI_ERROR_COUNT.labels(model='router', error_type=type(e).__name__).inc()
+    
+    # Track metrics
+    latency = time.time() - start_time
+    AI_LATENCY.labels(model='gemini', operation='classification').observe(latency)
+    
+    return doc_type, summary
+
+
+def build_summary_prompt(text):
+    return f"""Provide a concise 2-3 sentence summary of this document focusing on the key information and purpose:
 
 {text}
 
 Summary:"""
+
+
+def azure_generate(prompt, timeout=None, operation='classification'):
+    """Single-turn Azure OpenAI completion. Raises when the call fails."""
+    start_time = time.time()
+    AI_REQUEST_COUNT.labels(model='azure', operation=operation).inc()
     
-    # Try each API key until one works
-    for attempt in range(len(API_KEYS) if API_KEYS else 1):
-        try:
-            api = get_next_api_key()
-            if not api:
-                return "Error", "No API keys available"
-                
-            genai.configure(api_key=api)
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            # Get classification (returns string from Azure)
-            classification_response = get_azure_response(question_prompt_1)
-            print(classification_response)
+    response = azure_chat_completion(
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1000,
+        temperature=0.7,
+        timeout=timeout
+    )
+    AI_LATENCY.labels(model='azure', operation=operation).observe(time.time() - start_time)
+    
+    content = response.choices[0].message.content
+    if not content or not content.strip():
+        raise ValueError(f"Empty {operation} response")
+    return content.strip()
 
-            # Get summary (returns Gemini response object)
-            summary_response = model.generate_content(summary_prompt)
-            
-            # Track metrics
-            latency = time.time() - start_time
-            AI_LATENCY.labels(model='gemini', operation='classification').observe(latency)
-            
-            doc_type = "Other"
-            summary = "Unable to generate summary"
-            
-            # classification_response is already a string from get_azure_response
-            if classification_response and not classification_response.startswith("Error") and not classification_response.startswith("Azure Error"):
-                doc_type = classification_response.strip()
-            
-            # summary_response is a Gemini response object with candidates
-            if summary_response and hasattr(summary_response, 'candidates') and len(summary_response.candidates) > 0:
-                summary = summary_response.candidates[0].content.parts[0].text.strip()
-                
-                # Track summary tokens
-                if hasattr(summary_response, 'usage_metadata'):
-                    AI_TOKEN_COUNT.labels(model='gemini', type='summary_input').inc(summary_response.usage_metadata.prompt_token_count)
-                    AI_TOKEN_COUNT.labels(model='gemini', type='summary_output').inc(summary_response.usage_metadata.candidates_token_count)
-                    AI_TOKEN_COUNT.labels(model='gemini', type='total_input').inc(summary_response.usage_metadata.prompt_token_count)
-                    AI_TOKEN_COUNT.labels(model='gemini', type='total_output').inc(summary_response.usage_metadata.candidates_token_count)
-            
-            return doc_type, summary
-            
+
+def gemini_generate(prompt, timeout=None, operation='summary'):
+    """Gemini completion on the key pool, moving to another key on rate limits. Raises when every key fails."""
+    start_time = time.time()
+    AI_REQUEST_COUNT.labels(model='gemini', operation=operation).inc()
+    
+    # Route each attempt to the key with the most RPM/TPM headroom
+    estimated_tokens = estimate_tokens(prompt) + SUMMARY_OUTPUT_TOKEN_ESTIMATE
+    for attempt in range(max(len(gemini_key_pool), 1)):
+        key_state = gemini_key_pool.acquire(estimated_tokens, max_wait=KEY_POOL_MAX_WAIT_SECONDS)
+        
+        try:
+            model = get_gemini_model(key_state.key, 'gemini-2.5-flash')
+            request_options = {"timeout": timeout} if timeout else None
+            summary_response = model.generate_content(prompt, request_options=request_options)
         except Exception as e:
-            error_msg = str(e).lower()
             # Check if it's a rate limit error
-            if 'quota' in error_msg or 'rate limit' in error_msg or 'exceeded' in error_msg:
-                print(f"API key {attempt + 1} hit rate limit, trying next key...")
+            if is_rate_limit_error(e):
+                print(f"API {key_state.label} hit rate limit, trying next key...")
                 AI_ERROR_COUNT.labels(model='gemini', error_type='RateLimit').inc()
+                gemini_key_pool.report_rate_limited(key_state, retry_after_seconds(e))
                 continue
-            else:
-                # Other error, return immediately
-                AI_ERROR_COUNT.labels(model='gemini', error_type=type(e).__name__).inc()
-                return "Error", f"Classification failed: {str(e)}"
+            raise
+        
+        usage = getattr(summary_response, 'usage_metadata', None)
+        gemini_key_pool.report_success(
+            key_state, estimated_tokens, getattr(usage, 'total_token_count', None) if usage else None
+        )
+        
+        AI_LATENCY.labels(model='gemini', operation=operation).observe(time.time() - start_time)
+        
+        # summary_response is a Gemini response object with candidates
+        if not (summary_response and hasattr(summary_response, 'candidates') and len(summary_response.candidates) > 0):
+            raise ValueError(f"Empty {operation} response")
+        summary = summary_response.candidates[0].content.parts[0].text.strip()
+        
+        # Track tokens
+        if hasattr(summary_response, 'usage_metadata'):
+            AI_TOKEN_COUNT.labels(model='gemini', type=f'{operation}_input').inc(summary_response.usage_metadata.prompt_token_count)
+            AI_TOKEN_COUNT.labels(model='gemini', type=f'{operation}_output').inc(summary_response.usage_metadata.candidates_token_count)
+            AI_TOKEN_COUNT.labels(model='gemini', type='total_input').inc(summary_response.usage_metadata.prompt_token_count)
+            AI_TOKEN_COUNT.labels(model='gemini', type='total_output').inc(summary_response.usage_metadata.candidates_token_count)
+        
+        return summary
     
     # All API keys exhausted
-    return "Error", "All API keys have exceeded their limits"
+    raise RuntimeError("All API keys have exceeded their limits")
+
+
+# Classification prefers Azure and summaries prefer Gemini; each fails over to
+# (or is hedged against) the other provider
+classification_router = LLMRouter("classification", [
+    ("azure", partial(azure_generate, operation='classification')),
+    ("gemini", partial(gemini_generate, operation='classification')),
+], hedge=LLM_HEDGE_CLASSIFICATION)
+
+summary_router = LLMRouter("summary", [
+    ("gemini", partial(gemini_generate, operation='summary')),
+    ("azure", partial(azure_generate, operation='summary')),
+], hedge=LLM_HEDGE_SUMMARY)
+
+
+@traced("llm.classify_document")
+def classify_document(prompt, timeout=None):
+    """Classify through the provider router. Raises when every provider fails."""
+    return classification_router.call(prompt, timeout or CLASSIFICATION_TIMEOUT)
+
+
+@traced("llm.summarize_document")
+def summarize_document(prompt, timeout=None):
+    """Summarize through the provider router. Raises when every provider fails."""
+    return summary_router.call(prompt, timeout or SUMMARY_TIMEOUT)
    
 if __name__ == "__main__":
     print(get_azure_response("FIRST NOTICE OF LOSS. Policy Number: ABC123456. Date of loss: 03/15/2024. Claim number: CL789. I hereby provide notice that damage occurred to my insured property. Claimant signature required."))
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Registry of long-lived LLM clients.
+Each provider/key pair gets one client, shared across requests and threads,
+so connection pools and TLS sessions are reused instead of rebuilt per call.
+"""
+
+import hashlib
+import threading
+import httpx
+from openai import AzureOpenAI
+from google.ai import generativelanguage_v1beta as glm
+from prometheus_client import Counter
+
+from app.helpers.config import LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_KEEPALIVE_SECONDS, GEMINI_API_ENDPOINT
+
+# Client registry metrics
+try:
+    LLM_CLIENT_LOOKUPS = Counter('llm_client_lookups_total', 'LLM client registry lookups', ['provider', 'result'])
+    LLM_HTTP_REQUESTS = Counter('llm_http_requests_total', 'HTTP requests sent by pooled LLM clients', ['provider'])
+    LLM_CONNECTIONS_OPENED = Counter('llm_connections_opened_total', 'New TCP connections opened by pooled LLM clients', ['provider'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    LLM_CLIENT_LOOKUPS = REGISTRY._names_to_collectors['llm_client_lookups_total']
+    LLM_HTTP_REQUESTS = REGISTRY._names_to_collectors['llm_http_requests_total']
+    LLM_CONNECTIONS_OPENED = REGISTRY._names_to_collectors['llm_connections_opened_total']
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(api_key):
+    # Never keep raw keys as registry keys
+    return hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:16]
+
+
+def _get_or_create(provider, key, factory):
+    registry_key = (provider,) + key
+    with _lock:
+        client = _clients.get(registry_key)
+        if client is not None:
+            LLM_CLIENT_LOOKUPS.labels(provider=provider, result='reused').inc()
+            return client
+        client = factory()
+        _clients[registry_key] = client
+    LLM_CLIENT_LOOKUPS.labels(provider=provider, result='created').inc()
+    return client
+
+
+def _pooled_http_client(provider):
+    """httpx client with keep-alive pooling that counts requests and new connections."""
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            LLM_CONNECTIONS_OPENED.labels(provider=provider).inc()
+
+    def on_request(request):
+        LLM_HTTP_REQUESTS.labels(provider=provider).inc()
+        request.extensions["trace"] = trace
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS
+        ),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        event_hooks={"request": [on_request]}
+    )
+
+
+def get_azure_client(endpoint, api_key, api_version):
+    """Shared AzureOpenAI client for an endpoint/key pair."""
+    return _get_or_create(
+        "azure",
+        (endpoint, api_version, _fingerprint(api_key)),
+        lambda: AzureOpenAI(
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            api_key=api_key,
+            http_client=_pooled_http_client("azure")
+        )
+    )
+
+
+class GeminiModel:
+    """
+    A Gemini model on its own per-key GenerativeServiceClient, through the
+    public generativelanguage API. Responses are GenerateContentResponse
+    messages (candidates, usage_metadata).
+    """
+
+    def __init__(self, client, model_name):
+        self.client = client
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+    def generate_content(self, prompt, request_options=None):
+        request = glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])]
+        )
+        return self.client.generate_content(request=request, **(request_options or {}))
+
+
+def get_gemini_model(api_key, model_name):
+    """
+    Shared GeminiModel bound to its own per-key service client.
+    Avoids genai.configure, which swaps a process-wide key under concurrent callers.
+    """
+    def factory():
+        if GEMINI_API_ENDPOINT:
+            # Custom endpoints (e.g. the local fake) speak REST; gRPC needs the real service
+            client = glm.GenerativeServiceClient(
+                client_options={"api_key": api_key, "api_endpoint": GEMINI_API_ENDPOINT},
+                transport="rest"
+            )
+        else:
+            client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        return GeminiModel(client, model_name)
+
+    return _get_or_create("gemini", (model_name, _fingerprint(api_key)), factory)
@@ -0,0 +1,233 @@
+"""
+Provider routing for LLM calls: per-provider circuit breakers, failover in
+the configured order of preference and optional hedged requests timed by
+each provider's recent latency.
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from prometheus_client import Counter, Gauge
+
+from app.helpers.config import (
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_SECONDS,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_MAX_DELAY,
+)
+from app.helpers.key_pool import KeyPoolExhausted
+from app.helpers.logger import logger
+from app.helpers.tracing import propagate, start_span
+
+# Routing metrics
+try:
+    LLM_ROUTED_CALLS = Counter('llm_routed_calls_total', 'LLM calls by provider and outcome', ['provider', 'operation', 'outcome'])
+    LLM_HEDGED_CALLS = Counter('llm_hedged_calls_total', 'Hedged LLM calls by winning provider', ['operation', 'winner'])
+    LLM_BREAKER_STATE = Gauge('llm_circuit_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)', ['provider'])
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    LLM_ROUTED_CALLS = REGISTRY._names_to_collectors['llm_routed_calls_total']
+    LLM_HEDGED_CALLS = REGISTRY._names_to_collectors['llm_hedged_calls_total']
+    LLM_BREAKER_STATE = REGISTRY._names_to_collectors['llm_circuit_breaker_state']
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, lets one trial call through after the reset timeout."""
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+        LLM_BREAKER_STATE.labels(provider=name).set(0)
+
+    def available(self):
+        """Whether a call could be allowed now, without claiming the half-open trial."""
+        with self.lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_seconds
+            return not (self.state == HALF_OPEN and self.trial_in_flight)
+
+    def allow(self):
+        """Claim permission for one call."""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_in_flight = False
+            self._set_state(CLOSED)
+
+    def release(self):
+        """Give back a claimed call that neither succeeded nor counts as a failure."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state):
+        self.state = state
+        LLM_BREAKER_STATE.labels(provider=self.name).set(STATE_VALUES[state])
+
+
+class LatencyTracker:
+    """Recent successful call latencies for one provider/operation."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def quantile(self, q):
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Breakers are per provider, shared by every router that calls it
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider, LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+        return _breakers[provider]
+
+
+# Separate from the callers' pools so hedged calls never wait on their own pool
+router_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-route")
+
+
+class LLMRouter:
+    """
+    Routes one operation over several providers.
+    providers is an ordered list of (name, func) where func(prompt, timeout)
+    returns text and raises on failure. Providers are always tried in this
+    order; latency only decides when a hedged call is fired.
+    """
+
+    def __init__(self, operation, providers, hedge=False):
+        self.operation = operation
+        self.providers = providers
+        self.hedge = hedge
+        self.latency = {name: LatencyTracker() for name, _ in providers}
+
+    def _candidates(self):
+        """Providers whose breaker allows a call, in order of preference."""
+        return [(name, func) for name, func in self.providers if get_breaker(name).available()]
+
+    def _hedge_delay(self, name):
+        p95 = self.latency[name].quantile(0.95)
+        return min(p95 if p95 is not None else LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MAX_DELAY)
+
+    def _call_provider(self, name, func, prompt, timeout):
+        with start_span(f"llm.{self.operation}.{name}", {"llm.provider": name, "llm.operation": self.operation}):
+            return func(prompt, timeout)
+
+    def _launch(self, name, func, prompt, timeout):
+        started = time.monotonic()
+        future = router_executor.submit(propagate(self._call_provider), name, func, prompt, timeout)
+
+        def settle(done):
+            if done.exception() is None:
+                self.latency[name].observe(time.monotonic() - started)
+                get_breaker(name).record_success()
+                LLM_ROUTED_CALLS.labels(provider=name, operation=self.operation, outcome='success').inc()
+            elif isinstance(done.exception(), KeyPoolExhausted):
+                # Our own rate budget ran out; the provider itself is not failing
+                get_breaker(name).release()
+                LLM_ROUTED_CALLS.labels(provider=name, operation=self.operation, outcome='rate_limited').inc()
+            else:
+                get_breaker(name).record_failure()
+                LLM_ROUTED_CALLS.labels(provider=name, operation=self.operation, outcome='failure').inc()
+
+        future.add_done_callback(settle)
+        return future
+
+    def _launch_next(self, candidates, prompt, timeout, pending):
+        """Launch the next candidate whose breaker still admits a call. Returns its name or None."""
+        while candidates:
+            name, func = candidates.pop(0)
+            if get_breaker(name).allow():
+                pending[self._launch(name, func, prompt, timeout)] = name
+                return name
+        return None
+
+    def call(self, prompt, timeout):
+        """Return the first successful response. Raises when every provider fails or time runs out."""
+        deadline = time.monotonic() + timeout
+        candidates = self._candidates()
+        pending = {}
+        errors = []
+        hedged = False
+
+        name = self._launch_next(candidates, prompt, timeout, pending)
+        if name is None:
+            raise RuntimeError(f"No LLM provider available for {self.operation} (all circuits open)")
+        hedge_at = time.monotonic() + self._hedge_delay(name) if self.hedge and candidates else None
+
+        while pending or candidates:
+            now = time.monotonic()
+            remaining = deadline - now
+            if remaining <= 0:
+                break
+            if not pending:
+                # Everything launched so far failed: fail over to the next provider
+                self._launch_next(candidates, prompt, remaining, pending)
+                continue
+
+            wait_for = remaining if hedge_at is None else max(0.0, min(remaining, hedge_at - now))
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {str(e)}")
+                    continue
+                if hedged:
+                    LLM_HEDGED_CALLS.labels(operation=self.operation, winner=name).inc()
+                return result
+
+            if not done and hedge_at is not None and time.monotonic() >= hedge_at:
+                # Primary is slower than its p95: fire the backup and take whichever answers first
+                hedged = self._launch_next(candidates, prompt, deadline - time.monotonic(), pending) is not None
+                hedge_at = None
+
+        if errors:
+            raise RuntimeError(f"All LLM providers failed for {self.operation}: {'; '.join(errors)}")
+        raise TimeoutError(f"LLM {self.operation} timed out after {timeout}s")
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import Counter as TermCounter
+from prometheus_client import Counter, Histogram
+
+from app.helpers.config import (
+    LOCAL_CLASSIFIER_TRAINING_FILE,
+    LOCAL_CLASSIFIER_TEMPERATURE,
+    LOCAL_CLASSIFIER_RETRAIN_SECONDS,
+    LOCAL_CLASSIFIER_MIN_SAMPLES,
+    BENCHMARK_DATA_FILE,
+)
+from app.helpers.doc_types import KEY_PHRASES, KEY_PHRASE_DOC_TYPES, normalize_doc_type
+from app.helpers.logger import logger
+
+# Local classifier metrics
+try:
+    LOCAL_CLASSIFIER_DECISIONS = Counter('local_classifier_decisions_total', 'Local classifier decisions', ['outcome'])
+    LOCAL_CLASSIFIER_LATENCY = Histogram(
+        'local_classifier_seconds', 'Local classifier prediction time',
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+    )
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    LOCAL_CLASSIFIER_DECISIONS = REGISTRY._names_to_collectors['local_classifier_decisions_total']
+    LOCAL_CLASSIFIER_LATENCY = REGISTRY._names_to_collectors['local_classifier_seconds']
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9']+")
+
+
+def tokenize(text):
+    """Lower-cased unigrams and bigrams."""
+    words = TOKEN_PATTERN.findall(str(text).lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {term: value / norm for term, value in vector.items()}
+
+
+class LocalClassifier:
+    """TF-IDF nearest-centroid classifier for documents with obvious key phrases."""
+
+    def __init__(self, temperature=0.05):
+        self.temperature = temperature
+        self.idf = {}
+        self.centroids = {}
+        self.trained_at = None
+        self.sample_count = 0
+        self.class_counts = {}
+
+    def fit(self, samples, seeds=()):
+        """
+        Train from (text, label) pairs. Seeds (e.g. key-phrase lists) shape the
+        centroids but do not count as training documents in class_counts.
+        """
+        samples = [(text, label) for text, label in samples if text and label]
+        documents = [(TermCounter(tokenize(text)), label) for text, label in list(samples) + list(seeds) if text and label]
+        document_frequency = TermCounter()
+        for terms, _ in documents:
+            document_frequency.update(terms.keys())
+        total = len(documents)
+        self.idf = {
+            term: math.log((1 + total) / (1 + count)) + 1
+            for term, count in document_frequency.items()
+        }
+
+        sums = {}
+        for terms, label in documents:
+            vector = self._vectorize(terms)
+            centroid = sums.setdefault(label, {})
+            for term, value in vector.items():
+                centroid[term] = centroid.get(term, 0.0) + value
+        self.centroids = {label: _normalize(vector) for label, vector in sums.items()}
+        self.class_counts = dict(TermCounter(label for _, label in samples))
+        self.sample_count = len(samples)
+        self.trained_at = time.time()
+        return self
+
+    def _vectorize(self, terms):
+        return _normalize({
+            term: (1 + math.log(count)) * self.idf[term]
+            for term, count in terms.items() if term in self.idf
+        })
+
+    def predict(self, text):
+        """Return (label, confidence), or (None, 0.0) when nothing can be said."""
+        if not self.centroids:
+            return None, 0.0
+        vector = self._vectorize(TermCounter(tokenize(text)))
+        if not vector:
+            return None, 0.0
+
+        similarities = {
+            label: sum(value * centroid.get(term, 0.0) for term, value in vector.items())
+            for label, centroid in self.centroids.items()
+        }
+        # Softmax over cosine similarities; a low temperature rewards a clear winner
+        best = max(similarities.values())
+        weights = {
+            label: math.exp((similarity - best) / self.temperature)
+            for label, similarity in similarities.items()
+        }
+        label = max(weights, key=weights.get)
+        return label, weights[label] / sum(weights.values())
+
+
+def _doc_type(label):
+    """The DOC_TYPES category for a training label, or None when it is not one."""
+    doc_type, matched = normalize_doc_type(KEY_PHRASE_DOC_TYPES.get(label, label))
+    return doc_type if matched else None
+
+
+def load_training_samples():
+    """
+    (samples, seeds): labelled training cases and manually corrected
+    document_logs rows, both as extracted text, plus key-phrase seeds per
+    category. Every label is mapped onto DOC_TYPES; samples whose label is not
+    a category are dropped. The benchmark's test cases are never trained on.
+    """
+    samples = []
+    if os.path.abspath(LOCAL_CLASSIFIER_TRAINING_FILE) == os.path.abspath(BENCHMARK_DATA_FILE):
+        logger.error(f"Local classifier will not train on the benchmark data ({BENCHMARK_DATA_FILE})")
+    elif os.path.exists(LOCAL_CLASSIFIER_TRAINING_FILE):
+        try:
+            with open(LOCAL_CLASSIFIER_TRAINING_FILE, 'r') as f:
+                samples.extend((case['text'], case['expected_doc_type']) for case in json.load(f))
+        except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.error(f"Local classifier could not load {LOCAL_CLASSIFIER_TRAINING_FILE}: {str(e)}")
+
+    try:
+        from app.database.database import sessionlocal
+        from app.database.sql import get_corrected_documents
+        samples.extend((doc.extracted_text, doc.doc_type_predicted) for doc in get_corrected_documents(sessionlocal()))
+    except Exception as e:
+        logger.error(f"Local classifier could not load corrected documents: {str(e)}")
+
+    samples = [(text, _doc_type(label)) for text, label in samples]
+    seeds = [(" ".join(phrases), _doc_type(label)) for label, phrases in KEY_PHRASES.items()]
+    return [s for s in samples if s[1]], [s for s in seeds if s[1]]
+
+
+_classifier = None
+_last_training = 0.0
+_training_lock = threading.Lock()
+
+
+def _train():
+    global _classifier
+    try:
+        samples, seeds = load_training_samples()
+        _classifier = LocalClassifier(LOCAL_CLASSIFIER_TEMPERATURE).fit(samples, seeds)
+        logger.info(f"Local classifier trained on {_classifier.sample_count} samples: {_classifier.class_counts}")
+    except Exception as e:
+        logger.error(f"Local classifier training failed: {str(e)}")
+    finally:
+        _training_lock.release()
+
+
+def get_local_classifier():
+    """
+    The current classifier, or None before the first training has finished.
+    Training (including the database query) runs on a background thread once
+    the classifier is older than the retrain interval; requests never wait for it.
+    """
+    global _last_training
+    if time.time() - _last_training > LOCAL_CLASSIFIER_RETRAIN_SECONDS and _training_lock.acquire(blocking=False):
+        _last_training = time.time()
+        threading.Thread(target=_train, name="local-classifier-train", daemon=True).start()
+    return _classifier
+
+
+def classify_locally(text, threshold):
+    """
+    Predict a document type locally. Returns the label when confidence reaches
+    threshold and the label's category has at least LOCAL_CLASSIFIER_MIN_SAMPLES
+    training documents, otherwise None so the caller escalates to the LLM.
+    """
+    start_time = time.time()
+    classifier = get_local_classifier()
+    try:
+        label, confidence = classifier.predict(text) if classifier else (None, 0.0)
+    except Exception as e:
+        logger.error(f"Local classifier failed: {str(e)}")
+        label, confidence = None, 0.0
+    LOCAL_CLASSIFIER_LATENCY.observe(time.time() - start_time)
+
+    if label is not None and confidence >= threshold and classifier.class_counts.get(label, 0) >= LOCAL_CLASSIFIER_MIN_SAMPLES:
+        LOCAL_CLASSIFIER_DECISIONS.labels(outcome='local').inc()
+        return label, confidence
+    LOCAL_CLASSIFIER_DECISIONS.labels(outcome='escalated').inc()
+    return None, confidence
@@ -3,6 +3,7 @@ from logging.handlers import RotatingFileHandler
 from datetime import datetime
 import time
 import json
+from app.helpers.tracing import current_span
 
 class JSONFormatter(logging.Formatter):
     def format(self, record):
@@ -16,6 +17,10 @@ class JSONFormatter(logging.Formatter):
             "function": record.funcName,
             "line": record.lineno
         }
+        span = current_span()
+        if span is not None:
+            log_entry["trace_id"] = span.trace_id
+            log_entry["span_id"] = span.span_id
         if hasattr(record, 'extra_data'):
             log_entry.update(record.extra_data)
         return json.dumps(log_entry)
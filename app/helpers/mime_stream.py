@@ -0,0 +1,342 @@
+"""
+Streaming MIME parser for .eml files.
+
+The message is read line by line and never held in memory as a whole: each
+part's body is decoded incrementally (base64, quoted-printable or as is) into
+a sink. Text bodies are kept (HTML is converted to text when a message has no
+plain-text body) and attachments are spooled, in memory up to
+EML_SPOOL_MAX_BYTES and to a temporary file on disk beyond that.
+"""
+
+import io
+import os
+import codecs
+import binascii
+import mimetypes
+import tempfile
+from email import policy
+from email.parser import BytesHeaderParser
+
+from bs4 import BeautifulSoup
+
+from app.helpers.config import EML_SPOOL_MAX_BYTES, EML_MAX_BODY_CHARS
+
+# Longest line read at once; longer lines arrive in pieces
+LINE_LIMIT = 64 * 1024
+
+_header_parser = BytesHeaderParser(policy=policy.default)
+
+
+class SpooledAttachment:
+    """
+    Attachment content kept in memory until it grows past max_size, then moved
+    to a named temporary file (with the attachment's extension) so it can be
+    handed to extractors and uploads by path.
+    """
+
+    def __init__(self, name, max_size=None):
+        self.name = name
+        self.max_size = EML_SPOOL_MAX_BYTES if max_size is None else max_size
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+
+    def write(self, data):
+        if not data:
+            return
+        self.size += len(data)
+        if self.path is None and self.size > self.max_size:
+            spill = tempfile.NamedTemporaryFile(suffix=os.path.splitext(self.name)[1], prefix="eml_attachment_", delete=False)
+            spill.write(self._file.getvalue())
+            self._file = spill
+            self.path = spill.name
+        self._file.write(data)
+
+    def finish(self):
+        if self.path is not None:
+            self._file.close()
+
+    def getvalue(self):
+        """The content as bytes; only for attachments still in memory."""
+        if self.path is not None:
+            raise ValueError(f"{self.name} is spooled to disk at {self.path}")
+        return self._file.getvalue()
+
+    def close(self):
+        """Release the buffer and delete the temporary file, if any."""
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class _LineReader:
+    """Binary line reader with one line of push-back."""
+
+    def __init__(self, source):
+        self.source = source
+        self.pending = None
+        # A piece of an over-long line is not at a line start, so it cannot be a boundary
+        self.at_line_start = True
+
+    def readline(self):
+        """Return (line, starts_a_line); line is b"" at EOF."""
+        if self.pending is not None:
+            item, self.pending = self.pending, None
+            return item
+        line = self.source.readline(LINE_LIMIT)
+        starts = self.at_line_start
+        self.at_line_start = line.endswith(b"\n")
+        return line, starts
+
+    def push_back(self, item):
+        self.pending = item
+
+
+def _boundary_match(line, boundaries):
+    """(index into boundaries, is_closing) when line is a delimiter of one of them, else None."""
+    if not line.startswith(b"--"):
+        return None
+    stripped = line.rstrip(b" \t\r\n")
+    for index in range(len(boundaries) - 1, -1, -1):
+        delimiter = b"--" + boundaries[index]
+        if stripped == delimiter:
+            return index, False
+        if stripped == delimiter + b"--":
+            return index, True
+    return None
+
+
+def _split_newline(line):
+    if line.endswith(b"\r\n"):
+        return line[:-2], b"\r\n"
+    if line.endswith(b"\n"):
+        return line[:-1], b"\n"
+    return line, b""
+
+
+class _Base64Decoder:
+    def __init__(self, sink):
+        self.sink = sink
+        self.buffer = b""
+
+    def feed(self, data):
+        self.buffer += b"".join(data.split())
+        usable = len(self.buffer) - len(self.buffer) % 4
+        if usable:
+            try:
+                self.sink(binascii.a2b_base64(self.buffer[:usable]))
+            except binascii.Error:
+                pass
+            self.buffer = self.buffer[usable:]
+
+    def flush(self):
+        if self.buffer:
+            try:
+                self.sink(binascii.a2b_base64(self.buffer + b"=" * (-len(self.buffer) % 4)))
+            except binascii.Error:
+                pass
+            self.buffer = b""
+
+
+class _QuotedPrintableDecoder:
+    def __init__(self, sink):
+        self.sink = sink
+        self.buffer = b""
+
+    def feed(self, data):
+        data = self.buffer + data
+        self.buffer = b""
+        if not data.endswith(b"\n"):
+            # Keep an escape sequence cut by the line limit for the next piece
+            cut = data.rfind(b"=", max(0, len(data) - 2))
+            if cut != -1:
+                data, self.buffer = data[:cut], data[cut:]
+        self.sink(binascii.a2b_qp(data))
+
+    def flush(self):
+        if self.buffer:
+            self.sink(binascii.a2b_qp(self.buffer))
+            self.buffer = b""
+
+
+class _IdentityDecoder:
+    def __init__(self, sink):
+        self.sink = sink
+
+    def feed(self, data):
+        self.sink(data)
+
+    def flush(self):
+        pass
+
+
+DECODERS = {"base64": _Base64Decoder, "quoted-printable": _QuotedPrintableDecoder}
+
+
+class _TextSink:
+    """Incrementally decodes a text body, keeping at most EML_MAX_BODY_CHARS characters."""
+
+    def __init__(self, charset):
+        try:
+            decoder_class = codecs.getincrementaldecoder(charset or "utf-8")
+        except LookupError:
+            decoder_class = codecs.getincrementaldecoder("utf-8")
+        self.decoder = decoder_class(errors="replace")
+        self.parts = []
+        self.length = 0
+
+    def __call__(self, data):
+        if self.length < EML_MAX_BODY_CHARS:
+            text = self.decoder.decode(data)
+            self.parts.append(text)
+            self.length += len(text)
+
+    def text(self):
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return "".join(self.parts)[:EML_MAX_BODY_CHARS]
+
+
+class EmlStreamParser:
+    def __init__(self, source, keep_attachments=True):
+        self.reader = _LineReader(source)
+        self.keep_attachments = keep_attachments
+        self.plain = []
+        self.html = []
+        self.attachments = []
+
+    def _read_headers(self):
+        lines = []
+        while True:
+            line, starts = self.reader.readline()
+            # The tail of a header line cut by the line limit is not the blank line ending the headers
+            if not line or (starts and line in (b"\r\n", b"\n")):
+                break
+            lines.append(line)
+        return _header_parser.parsebytes(b"".join(lines))
+
+    def _read_body(self, boundaries, sink):
+        """
+        Feed the body up to the next delimiter of any enclosing multipart into
+        sink, push the delimiter back and return. The line break before a
+        delimiter belongs to the delimiter, so each line's break is held back
+        until the next line arrives.
+        """
+        pending_newline = b""
+        while True:
+            line, starts = self.reader.readline()
+            if not line:
+                return
+            if starts and _boundary_match(line, boundaries):
+                self.reader.push_back((line, starts))
+                return
+            if sink is not None:
+                content, newline = _split_newline(line)
+                sink(pending_newline + content)
+                pending_newline = newline
+
+    def _attachment_name(self, headers, content_type):
+        name = headers.get_filename()
+        if not name and content_type == "message/rfc822":
+            name = "attached_message.eml"
+        if not name:
+            name = f"attachment_{len(self.attachments) + 1}{mimetypes.guess_extension(content_type) or '.bin'}"
+        return os.path.basename(name.replace("\\", "/"))
+
+    def _role(self, headers, content_type, in_related):
+        """"body", "attachment" or "inline" (a resource of the HTML body, dropped)."""
+        disposition = headers.get_content_disposition()
+        if disposition == "attachment":
+            return "attachment"
+        if content_type in ("text/plain", "text/html") and not headers.get_filename():
+            return "body"
+        # Inline resources of an HTML body (logos, signature images) are not documents
+        if in_related and headers.get("Content-ID"):
+            return "inline"
+        return "attachment"
+
+    def _leaf(self, headers, boundaries, in_related):
+        content_type = headers.get_content_type()
+        encoding = str(headers.get("Content-Transfer-Encoding", "")).strip().lower()
+        role = self._role(headers, content_type, in_related)
+
+        sink, finish = None, None
+        if role == "body":
+            text = _TextSink(headers.get_content_charset())
+            sink = text
+            target = self.plain if content_type == "text/plain" else self.html
+            finish = lambda: target.append(text.text())
+        elif role == "attachment" and self.keep_attachments:
+            attachment = SpooledAttachment(self._attachment_name(headers, content_type))
+            sink = attachment.write
+
+            def finish():
+                attachment.finish()
+                self.attachments.append(attachment)
+
+        if sink is None:
+            self._read_body(boundaries, None)
+            return
+        decoder = DECODERS.get(encoding, _IdentityDecoder)(sink)
+        self._read_body(boundaries, decoder.feed)
+        decoder.flush()
+        finish()
+
+    def _part(self, boundaries, in_related=False):
+        headers = self._read_headers()
+        content_type = headers.get_content_type()
+        boundary = headers.get_boundary() if content_type.startswith("multipart/") else None
+        if not boundary:
+            self._leaf(headers, boundaries, in_related)
+            return
+
+        boundaries = boundaries + [boundary.encode("utf-8", "replace")]
+        depth = len(boundaries) - 1
+        in_related = content_type == "multipart/related"
+        # Preamble
+        self._read_body(boundaries, None)
+        while True:
+            line, starts = self.reader.readline()
+            if not line:
+                return
+            match = _boundary_match(line, boundaries)
+            if match is None:
+                continue
+            index, closing = match
+            if index < depth:
+                # An enclosing part ends here without our closing delimiter
+                self.reader.push_back((line, starts))
+                return
+            if closing:
+                # Epilogue
+                self._read_body(boundaries[:-1], None)
+                return
+            self._part(boundaries, in_related)
+
+    def parse(self):
+        self._part([])
+        if self.plain:
+            text = "\n\n".join(part for part in self.plain if part.strip())
+        else:
+            text = "\n\n".join(BeautifulSoup(html, "html.parser").get_text("\n", strip=True) for html in self.html)
+        return text, self.attachments
+
+
+def parse_eml(source, keep_attachments=True):
+    """
+    Body text and attachments of an .eml read from a path or a binary file
+    object. Attachments come back as SpooledAttachment objects the caller must
+    close(); with keep_attachments=False they are skipped without buffering.
+    """
+    if hasattr(source, "readline"):
+        parser = EmlStreamParser(source, keep_attachments)
+        try:
+            return parser.parse()
+        except Exception:
+            for attachment in parser.attachments:
+                attachment.close()
+            raise
+    with open(source, "rb") as f:
+        return parse_eml(f, keep_attachments)
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from prometheus_client import Counter, Gauge
+
+from app.helpers.config import OCR_CACHE_ENABLED, OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES
+from app.helpers.logger import logger
+
+# OCR cache metrics
+try:
+    OCR_CACHE_REQUESTS = Counter('ocr_cache_requests_total', 'OCR cache lookups', ['result'])
+    OCR_CACHE_EVICTIONS = Counter('ocr_cache_evictions_total', 'OCR cache entries evicted')
+    OCR_CACHE_SIZE = Gauge('ocr_cache_size_bytes', 'Bytes of OCR text held in the cache')
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    OCR_CACHE_REQUESTS = REGISTRY._names_to_collectors['ocr_cache_requests_total']
+    OCR_CACHE_EVICTIONS = REGISTRY._names_to_collectors['ocr_cache_evictions_total']
+    OCR_CACHE_SIZE = REGISTRY._names_to_collectors['ocr_cache_size_bytes']
+
+
+def cache_key(payload, model_id):
+    """Hash of the exact bytes sent to Document Intelligence plus the model id."""
+    digest = hashlib.sha256(model_id.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """Size-bounded on-disk LRU cache of OCR page text, stored in SQLite."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                pages TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_access ON ocr_cache (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        OCR_CACHE_SIZE.set(self.total_bytes)
+
+    def get(self, key):
+        """Return the cached list of page texts, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT pages FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                OCR_CACHE_REQUESTS.labels(result='miss').inc()
+                return None
+            self.conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        OCR_CACHE_REQUESTS.labels(result='hit').inc()
+        return json.loads(row[0])
+
+    def put(self, key, pages):
+        data = json.dumps(pages)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            existing = self.conn.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, pages, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self.total_bytes += size - (existing[0] if existing else 0)
+            self._evict()
+            self.conn.commit()
+        OCR_CACHE_SIZE.set(self.total_bytes)
+
+    def _evict(self):
+        # Drop least recently used entries until back under the bound
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM ocr_cache ORDER BY last_access ASC LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self.total_bytes -= size
+                OCR_CACHE_EVICTIONS.inc()
+
+
+def _open_cache():
+    if not OCR_CACHE_ENABLED:
+        return None
+    try:
+        return OcrCache(OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES)
+    except Exception as e:
+        logger.error(f"OCR cache disabled, failed to open {OCR_CACHE_PATH}: {str(e)}")
+        return None
+
+
+# Global OCR cache instance (None when disabled)
+ocr_cache = _open_cache()
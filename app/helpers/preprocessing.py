@@ -0,0 +1,91 @@
+"""
+Page image preprocessing for OCR.
+Kept free of app imports so process-pool workers only load cv2, numpy and PIL.
+"""
+
+import time
+from io import BytesIO
+from PIL import Image
+import cv2
+import numpy as np
+
+ENCODERS = ("png", "jpeg", "tiff_g4")
+
+
+def pil_to_bytes(image):
+    buf = BytesIO()
+    Image.fromarray(image).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def preprocessImage(image, upscale=True):
+    # Ensure image is in RGB mode
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if upscale:
+        new_size = (image.width * 2, image.height * 2)
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    np_image_rescaled = np.array(image)
+
+    gray_image = cv2.cvtColor(np_image_rescaled, cv2.COLOR_RGB2GRAY)  # Use RGB, not BGR
+
+    blurred_image = cv2.GaussianBlur(gray_image, (3, 3), 0)
+    binary_image = cv2.adaptiveThreshold(
+        blurred_image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY, 37, 1
+    )
+    return binary_image
+
+
+def needs_upscale(image, upscale_max_dpi):
+    """Upscale only scans below upscale_max_dpi. Images without DPI info are always upscaled."""
+    dpi = image.info.get("dpi")
+    if not dpi or not upscale_max_dpi:
+        return True
+    return min(float(d) for d in dpi) < upscale_max_dpi
+
+
+def prepare_page(image, upscale_max_dpi=0):
+    """Binarize a page, skipping the 2x upscale when the source DPI is already high."""
+    return preprocessImage(image, upscale=needs_upscale(image, upscale_max_dpi))
+
+
+def encode_page(page, encoder="png", jpeg_quality=85):
+    """Encode a binarized page array straight from NumPy."""
+    if encoder == "png":
+        ok, buf = cv2.imencode(".png", page, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    elif encoder == "jpeg":
+        ok, buf = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    elif encoder == "tiff_g4":
+        # OpenCV cannot write 1-bit CCITT G4, so this one goes through PIL
+        out = BytesIO()
+        Image.fromarray(page).convert("1").save(out, format="TIFF", compression="group4")
+        return out.getvalue()
+    else:
+        raise ValueError(f"Unknown OCR encoder: {encoder}")
+    if not ok:
+        raise ValueError(f"Failed to encode page as {encoder}")
+    return buf.tobytes()
+
+
+def preprocess_page(image, encoder="png", jpeg_quality=85, upscale_max_dpi=0):
+    """Preprocess and encode a page for OCR. Returns (payload, encode_seconds)."""
+    page = prepare_page(image, upscale_max_dpi)
+    start = time.perf_counter()
+    payload = encode_page(page, encoder, jpeg_quality)
+    return payload, time.perf_counter() - start
+
+
+def warm_up():
+    """Pool initializer: run one tiny page through the pipeline so cv2/PIL are loaded."""
+    for encoder in ENCODERS:
+        preprocess_page(Image.new("RGB", (64, 64), "white"), encoder)
+
+
+def pack_pages_tiff(pages):
+    """Pack binarized page arrays into one multi-page CCITT G4 TIFF."""
+    images = [Image.fromarray(page).convert("1") for page in pages]
+    buf = BytesIO()
+    images[0].save(buf, format="TIFF", save_all=True, append_images=images[1:], compression="group4")
+    return buf.getvalue()
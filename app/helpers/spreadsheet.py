@@ -0,0 +1,318 @@
+"""
+Bounded-memory spreadsheet extraction.
+
+Workbooks are read lazily (xlrd on_demand for .xls, openpyxl read_only for
+.xlsx/.xlsm), one sheet and one row at a time. Instead of the full grid, each
+sheet is reduced to a digest: headers, inferred column types with ranges and
+totals, the first rows, a uniform random sample of the rest and the last row.
+Memory per sheet is bounded by the sample size and column cap, not the sheet
+size, and the rendered digest is kept within a token budget.
+"""
+
+import re
+import math
+import random
+from datetime import datetime, date, time as dt_time
+
+from app.helpers.config import SPREADSHEET_TOKEN_BUDGET, SPREADSHEET_SAMPLE_ROWS, SPREADSHEET_MAX_COLUMNS
+from app.helpers.text_selection import estimate_tokens
+from app.helpers.tracing import traced, set_attributes
+
+# Rows always kept from the top of a sheet; the rest of the sample is drawn from below them
+HEAD_ROWS = 5
+MAX_CELL_CHARS = 60
+# Smallest budget a sheet gets, so every sheet shows at least its shape and columns
+MIN_SHEET_TOKENS = 150
+
+# An amount stored as text: optional parentheses or minus, optional "$", digits
+# (grouped by thousands or not) and an optional fraction
+_AMOUNT = re.compile(r"(\()?\s*(-)?\s*(\$)?\s*(-)?\s*(\d{1,3}(?:,\d{3})+|\d+)?(\.\d+)?\s*(\))?")
+# Header words of columns holding identifiers; their totals mean nothing
+_IDENTIFIER_WORDS = {"id", "no", "num", "number", "code", "zip", "zipcode", "postcode", "phone", "ssn", "vin"}
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _as_number(text):
+    """
+    Amounts stored as text ("$12,500", "(300.00)", "1,200", "0.75"), or None.
+    Bare digit strings stay text: they are as likely to be claim numbers or
+    zip codes, and leading zeros ("000123") mark them as such.
+    """
+    match = _AMOUNT.fullmatch(text.strip())
+    if match is None:
+        return None
+    opening, minus, currency, minus_after, whole, fraction, closing = match.groups()
+    if whole is None and fraction is None:
+        return None
+    if bool(opening) != bool(closing) or (minus and minus_after):
+        return None
+    if whole is not None and len(whole) > 1 and whole.startswith("0"):
+        return None
+    if not (currency or opening or fraction or (whole and "," in whole)):
+        return None
+    number = float((whole or "0").replace(",", "") + (fraction or ""))
+    return -number if opening or minus or minus_after else number
+
+
+def _is_identifier(header):
+    words = re.findall(r"[a-z0-9]+", header.lower())
+    return header.rstrip().endswith("#") or (bool(words) and words[-1] in _IDENTIFIER_WORDS)
+
+
+def _kind(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, (datetime, date, dt_time)):
+        return "date"
+    return "text"
+
+
+def format_cell(value):
+    if _is_empty(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == dt_time() else value.isoformat(sep=" ")
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    text = " ".join(str(value).split())
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 3] + "..."
+
+
+class _ColumnStats:
+    def __init__(self):
+        self.kinds = {}
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        if isinstance(value, str):
+            number = _as_number(value)
+            value = value if number is None else number
+        elif isinstance(value, float) and not math.isfinite(value):
+            value = str(value)
+        kind = _kind(value)
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        if kind == "number" or kind == "date":
+            if kind == "number":
+                self.total += value
+            try:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+            except TypeError:
+                pass
+
+    @property
+    def kind(self):
+        if not self.kinds:
+            return "empty"
+        kind, count = max(self.kinds.items(), key=lambda item: item[1])
+        return kind if count >= 0.8 * sum(self.kinds.values()) else "mixed"
+
+    def describe(self):
+        kind = self.kind
+        filled = sum(self.kinds.values())
+        if kind == "number":
+            return f"number, {filled} values, min {format_cell(self.minimum)}, max {format_cell(self.maximum)}"
+        if kind == "date" and self.minimum is not None:
+            return f"date, {filled} values, {format_cell(self.minimum)} to {format_cell(self.maximum)}"
+        return f"{kind}, {filled} values"
+
+
+class SheetDigest:
+    """Summary of one sheet, fed row by row."""
+
+    def __init__(self, name, sample_rows=None, seed=0):
+        self.name = name
+        self.sample_size = SPREADSHEET_SAMPLE_ROWS if sample_rows is None else sample_rows
+        self.headers = None
+        self.titles = []
+        self.columns = []
+        self.width = 0
+        self.row_count = 0
+        self.head = []
+        self.sample = []
+        self.last = None
+        # Fixed seed: the same workbook always yields the same digest
+        self.random = random.Random(seed)
+        self.seen_after_head = 0
+
+    def add_row(self, number, values):
+        values = list(values[:SPREADSHEET_MAX_COLUMNS])
+        while values and _is_empty(values[-1]):
+            values.pop()
+        if not values:
+            return
+        if self.headers is None and not self.row_count and all(isinstance(v, str) or _is_empty(v) for v in values):
+            # Report titles above the header row ("Loss Run as of ...") hold a single cell
+            filled = [v for v in values if not _is_empty(v)]
+            if len(filled) > 1:
+                self.headers = [format_cell(v) for v in values]
+                return
+            if len(self.titles) < 3:
+                self.titles.append(format_cell(filled[0]))
+                return
+
+        self.row_count += 1
+        self.width = max(self.width, len(values))
+        while len(self.columns) < len(values):
+            self.columns.append(_ColumnStats())
+        for stats, value in zip(self.columns, values):
+            if not _is_empty(value):
+                stats.add(value)
+
+        row = (number, [format_cell(v) for v in values])
+        self.last = row
+        if len(self.head) < HEAD_ROWS:
+            self.head.append(row)
+            return
+        # Reservoir sampling over the rows below the head
+        self.seen_after_head += 1
+        reservoir = max(0, self.sample_size - HEAD_ROWS)
+        if len(self.sample) < reservoir:
+            self.sample.append(row)
+        else:
+            slot = self.random.randrange(self.seen_after_head)
+            if slot < reservoir:
+                self.sample[slot] = row
+
+    def column_name(self, index):
+        if self.headers and index < len(self.headers) and self.headers[index]:
+            return self.headers[index]
+        return f"Column {index + 1}"
+
+    def rows(self):
+        """Head rows, then the sample in sheet order, then the last row."""
+        rows = self.head + sorted(self.sample, key=lambda row: row[0])
+        if self.last is not None and (not rows or rows[-1][0] != self.last[0]):
+            rows.append(self.last)
+        return rows
+
+    def render(self, budget):
+        lines = [f"Sheet: {self.name} ({self.row_count} data rows x {self.width} columns)"]
+        lines.extend(f"Title: {title}" for title in self.titles)
+        if not self.row_count:
+            if self.headers:
+                lines.append("Headers: " + " | ".join(self.headers))
+            return "\n".join(lines)
+
+        lines.append("Columns:")
+        used = estimate_tokens("\n".join(lines))
+        for i, stats in enumerate(self.columns):
+            line = f"  {self.column_name(i)}: {stats.describe()}"
+            if used + estimate_tokens(line) + 1 > budget:
+                lines.append(f"  [{len(self.columns) - i} more columns omitted]")
+                break
+            lines.append(line)
+            used += estimate_tokens(line) + 1
+        totals = [
+            f"{self.column_name(i)} = {format_cell(stats.total)}"
+            for i, stats in enumerate(self.columns)
+            if stats.kind == "number" and not _is_identifier(self.column_name(i))
+        ]
+        if totals:
+            lines.append("Totals: " + ", ".join(totals))
+
+        rows = self.rows()
+        lines.append("Rows" + (f" (sample of {len(rows)})" if len(rows) < self.row_count else "") + ":")
+        if self.headers:
+            lines.append("  header: " + " | ".join(self.headers))
+        used = estimate_tokens("\n".join(lines))
+        shown = 0
+        for number, values in rows:
+            line = f"  row {number}: " + " | ".join(values)
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+            shown += 1
+        if shown < len(rows):
+            lines.append(f"  [{len(rows) - shown} sampled rows omitted]")
+        return "\n".join(lines)
+
+
+def _iter_xls(source):
+    import xlrd
+
+    if isinstance(source, str):
+        book = xlrd.open_workbook(filename=source, on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+    try:
+        for index, name in enumerate(book.sheet_names()):
+            sheet = book.sheet_by_index(index)
+
+            def rows(sheet=sheet):
+                for r in range(sheet.nrows):
+                    values = []
+                    for cell in sheet.row(r):
+                        if cell.ctype == xlrd.XL_CELL_DATE:
+                            try:
+                                values.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                            except (ValueError, OverflowError):
+                                values.append(cell.value)
+                        elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                            values.append(bool(cell.value))
+                        elif cell.ctype in (xlrd.XL_CELL_ERROR, xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                            values.append(None)
+                        else:
+                            values.append(cell.value)
+                    yield r + 1, values
+
+            yield name, len(book.sheet_names()), rows()
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+def _iter_xlsx(source):
+    import openpyxl
+
+    book = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for sheet in book.worksheets:
+            rows = ((number, list(values)) for number, values in enumerate(sheet.iter_rows(values_only=True), start=1))
+            yield sheet.title, len(book.worksheets), rows
+    finally:
+        book.close()
+
+
+@traced("extraction.spreadsheet")
+def read_spreadsheet(source, extension, token_budget=None):
+    """
+    Text digest of a workbook (a path or a binary file object) within
+    token_budget tokens, split evenly across its sheets.
+    """
+    budget = SPREADSHEET_TOKEN_BUDGET if token_budget is None else token_budget
+    sheets = _iter_xls(source) if extension.lower() == ".xls" else _iter_xlsx(source)
+
+    parts, used, total_rows = [], 0, 0
+    try:
+        for index, (name, sheet_count, rows) in enumerate(sheets):
+            if used + MIN_SHEET_TOKENS > budget:
+                parts.append(f"[{sheet_count - index} more sheets omitted]")
+                break
+            digest = SheetDigest(name)
+            for number, values in rows:
+                digest.add_row(number, values)
+            total_rows += digest.row_count
+
+            sheet_budget = max(MIN_SHEET_TOKENS, (budget - used) // (sheet_count - index))
+            text = digest.render(min(sheet_budget, budget - used))
+            parts.append(text)
+            used += estimate_tokens(text) + 1
+    finally:
+        sheets.close()
+
+    set_attributes(**{"spreadsheet.rows": total_rows, "spreadsheet.sheets": len(parts), "spreadsheet.tokens": used})
+    return "\n\n".join(parts)
@@ -0,0 +1,105 @@
+import time
+import threading
+
+import pytest
+
+from app.helpers.dedup import SingleFlight, hash_bytes, hash_file
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_identical_keys_collapse_to_one_call():
+    flight = SingleFlight()
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def analyze():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"doc_type": "Police Reports"}
+
+    threads, results, errors = run_concurrently(8, lambda: flight.do("hash-1", analyze))
+    assert started.wait(5)
+    # Give the other callers time to join the call in flight
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert not errors
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"doc_type": "Police Reports"} for result, _ in results)
+    assert flight.calls == {}
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(2, timeout=5)
+
+    def analyze(key):
+        calls.append(key)
+        # Both keys must be in flight together, or this times out
+        barrier.wait()
+        return key
+
+    results = []
+    threads = [threading.Thread(target=lambda k=k: results.append(flight.do(k, analyze, k))) for k in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(calls) == ["a", "b"]
+    assert sorted(results) == [("a", False), ("b", False)]
+
+
+def test_error_is_shared_and_the_key_is_released():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("extraction failed")
+
+    threads, results, errors = run_concurrently(4, lambda: flight.do("hash-1", failing))
+    assert started.wait(5)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert not results
+    assert len(errors) == 4 and all(str(e) == "extraction failed" for e in errors)
+    # A later call runs again instead of reusing the failure
+    assert flight.do("hash-1", lambda: "ok") == ("ok", False)
+
+
+def test_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("hash-1", lambda: 1) == (1, False)
+    assert flight.do("hash-1", lambda: 2) == (2, False)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024 * 1024])
+def test_hash_file_matches_hash_bytes(tmp_path, chunk_size):
+    data = bytes(range(256)) * 40
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(data)
+    assert hash_file(str(path), chunk_size=chunk_size) == hash_bytes(data)
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from app.helpers.jobs import JobQueue, QUEUED, RUNNING, COMPLETED, FAILED
+
+
+def drain(queue):
+    queue.executor.shutdown(wait=True)
+
+
+def test_job_runs_and_records_its_stages():
+    queue = JobQueue(max_workers=2)
+
+    def work(x, y=0):
+        queue.set_stage("job-1", "extraction")
+        return x + y
+
+    queue.submit("job-1", work, 2, y=3)
+    drain(queue)
+
+    job = queue.get("job-1")
+    assert job["status"] == COMPLETED
+    assert job["result"] == 5 and job["error"] is None
+    assert [entry["stage"] for entry in job["stage_history"]] == [QUEUED, RUNNING, "extraction", COMPLETED]
+    assert job["submitted_at"] <= job["started_at"] <= job["finished_at"]
+
+
+def test_failed_job_records_the_error():
+    queue = JobQueue(max_workers=1)
+
+    def work():
+        raise ValueError("bad file")
+
+    queue.submit("job-1", work)
+    drain(queue)
+
+    job = queue.get("job-1")
+    assert job["status"] == FAILED
+    assert job["error"] == "bad file" and job["result"] is None
+
+
+def test_jobs_wait_for_a_free_worker():
+    queue = JobQueue(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    queue.submit("first", blocking)
+    queue.submit("second", lambda: "done")
+    assert started.wait(5)
+    try:
+        assert queue.get("first")["status"] == RUNNING
+        assert queue.get("second")["status"] == QUEUED
+    finally:
+        release.set()
+    drain(queue)
+    assert queue.get("second")["status"] == COMPLETED
+
+
+def test_get_returns_a_snapshot():
+    queue = JobQueue(max_workers=1)
+    queue.submit("job-1", lambda: None)
+    drain(queue)
+
+    snapshot = queue.get("job-1")
+    snapshot["status"] = "tampered"
+    snapshot["stage_history"].clear()
+    assert queue.get("job-1")["status"] == COMPLETED
+    assert queue.get("job-1")["stage_history"]
+
+
+def test_set_stage_ignores_unknown_jobs():
+    queue = JobQueue(max_workers=1)
+    queue.set_stage(None, "extraction")
+    queue.set_stage("missing", "extraction")
+    assert queue.get("missing") is None
+
+
+def test_history_limit_drops_oldest_finished_jobs_only():
+    queue = JobQueue(max_workers=1, history_limit=2)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    queue.submit("old", lambda: None)
+    queue.submit("running", blocking)
+    assert started.wait(5)
+    try:
+        # "old" is finished and goes first; "running" is kept although it is now the oldest
+        queue.submit("new", lambda: None)
+        assert queue.get("old") is None
+        queue.submit("newest", lambda: None)
+        assert queue.get("running") is not None
+    finally:
+        release.set()
+    drain(queue)
+
+
+@pytest.mark.parametrize("history_limit", [0, 1])
+def test_unfinished_jobs_are_never_trimmed(history_limit):
+    queue = JobQueue(max_workers=1, history_limit=history_limit)
+    release = threading.Event()
+    queue.submit("a", release.wait, 5)
+    queue.submit("b", lambda: None)
+    try:
+        assert queue.get("a") is not None and queue.get("b") is not None
+    finally:
+        release.set()
+    drain(queue)
@@ -0,0 +1,136 @@
+import pytest
+
+from app.helpers import key_pool
+from app.helpers.key_pool import KeyPool, KeyPoolExhausted, retry_after_seconds, is_rate_limit_error
+
+
+class FakeClock:
+    """Stands in for the time module; sleep() advances the clock instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(key_pool, "time", fake)
+    return fake
+
+
+def labels(pool, count, **kwargs):
+    return [pool.acquire(**kwargs).label for _ in range(count)]
+
+
+def test_requests_rotate_across_keys(clock):
+    pool = KeyPool("gemini", ["a", "b", "c"], rpm=10, tpm=100000)
+    assert labels(pool, 6) == ["key_1", "key_2", "key_3", "key_1", "key_2", "key_3"]
+    assert clock.slept == 0
+
+
+def test_acquire_waits_for_the_rpm_budget_to_refill(clock):
+    pool = KeyPool("gemini", ["a", "b"], rpm=2, tpm=100000)
+    assert labels(pool, 4) == ["key_1", "key_2", "key_1", "key_2"]
+
+    # 2 requests per minute refill one request every 30 seconds
+    state = pool.acquire(max_wait=60)
+    assert state.label == "key_1"
+    assert clock.slept == pytest.approx(30, abs=1)
+
+
+def test_acquire_gives_up_after_max_wait(clock):
+    pool = KeyPool("gemini", ["a"], rpm=1, tpm=100000)
+    pool.acquire()
+    with pytest.raises(KeyPoolExhausted):
+        pool.acquire(max_wait=5)
+    assert clock.slept == pytest.approx(5)
+
+
+def test_no_keys_fails_immediately(clock):
+    with pytest.raises(KeyPoolExhausted):
+        KeyPool("gemini", [], rpm=10, tpm=1000).acquire()
+    assert clock.slept == 0
+
+
+def test_token_budget_picks_the_key_with_headroom(clock):
+    pool = KeyPool("gemini", ["a", "b"], rpm=10, tpm=1000)
+    assert pool.acquire(estimated_tokens=800).label == "key_1"
+    # key_1 has 200 tokens left, so a 500-token request goes to key_2
+    assert pool.acquire(estimated_tokens=500).label == "key_2"
+    # key_2 has 500 left, key_1 only 200
+    assert pool.acquire(estimated_tokens=400).label == "key_2"
+
+
+def test_report_success_settles_actual_usage(clock):
+    pool = KeyPool("gemini", ["a"], rpm=10, tpm=1000)
+    state = pool.acquire(estimated_tokens=100)
+    pool.report_success(state, estimated_tokens=100, actual_tokens=700)
+    assert state.tokens.tokens == pytest.approx(300)
+
+
+def test_rate_limited_key_cools_down_for_retry_after(clock):
+    pool = KeyPool("gemini", ["a", "b"], rpm=10, tpm=100000)
+    limited = pool.acquire()
+    pool.report_rate_limited(limited, retry_after=120)
+
+    assert labels(pool, 4) == ["key_2"] * 4
+    clock.now += 121
+    assert "key_1" in labels(pool, 2)
+
+
+def test_cooldown_backs_off_exponentially_until_a_success(clock):
+    pool = KeyPool("gemini", ["a"], rpm=10, tpm=100000, cooldown_seconds=60, max_cooldown_seconds=100)
+    state = pool.states[0]
+
+    pool.report_rate_limited(state)
+    assert state.cooldown_until == pytest.approx(clock.now + 60)
+    pool.report_rate_limited(state)
+    assert state.cooldown_until == pytest.approx(clock.now + 100)
+
+    pool.report_success(state)
+    pool.report_rate_limited(state)
+    assert state.cooldown_until == pytest.approx(clock.now + 60)
+
+
+def test_set_keys_keeps_the_state_of_existing_keys(clock):
+    pool = KeyPool("gemini", ["a", "b"], rpm=10, tpm=100000)
+    state = pool.acquire()
+    pool.set_keys(["a", "c"])
+    assert len(pool) == 2
+    assert pool.states[0] is state
+    assert pool.states[1].key == "c"
+
+
+class RateLimitError(Exception):
+    def __init__(self, message, headers=None, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimitError("slow down", {"retry-after": "12"}), 12.0),
+    (RateLimitError("slow down", {"retry-after-ms": "1500"}), 1.5),
+    (Exception("429 Quota exceeded. Please retry in 7.5s."), 7.5),
+    (Exception("retry_delay { seconds: 31 }"), 31.0),
+    (Exception("quota exceeded"), None),
+])
+def test_retry_after_seconds(error, expected):
+    assert retry_after_seconds(error) == expected
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(RateLimitError("", status_code=429))
+    assert is_rate_limit_error(Exception("429 Resource exhausted"))
+    assert not is_rate_limit_error(Exception("500 Internal error"))
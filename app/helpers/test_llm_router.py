@@ -0,0 +1,216 @@
+import time
+import threading
+
+import pytest
+
+from app.helpers import llm_router
+from app.helpers.key_pool import KeyPoolExhausted
+from app.helpers.llm_router import CircuitBreaker, LLMRouter, get_breaker, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(llm_router, "_breakers", {})
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_FAILURE_THRESHOLD", 2)
+
+
+def eventually(condition, timeout=2.0):
+    # Breakers and latency are settled in a done-callback, just after the caller sees the result
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(llm_router, "time", FakeClock())
+    breaker = CircuitBreaker("azure", failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available() and not breaker.allow()
+
+
+def test_breaker_half_opens_with_a_single_trial(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_router, "time", clock)
+    breaker = CircuitBreaker("azure", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call at a time
+    assert not breaker.available() and not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_router, "time", clock)
+    breaker = CircuitBreaker("azure", failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_released_trial_can_be_claimed_again(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_router, "time", clock)
+    breaker = CircuitBreaker("gemini", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def provider(result=None, error=None, delay=0.0, calls=None):
+    def call(prompt, timeout):
+        if calls is not None:
+            calls.append(prompt)
+        if delay:
+            time.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return call
+
+
+def test_router_keeps_the_configured_order_when_the_backup_is_faster():
+    router = LLMRouter("classification", [("azure", provider("from azure")), ("gemini", provider("from gemini"))])
+    for _ in range(20):
+        router.latency["azure"].observe(3.0)
+        router.latency["gemini"].observe(0.5)
+    assert router.call("prompt", timeout=5) == "from azure"
+
+
+def test_router_fails_over_to_the_next_provider():
+    calls = []
+    router = LLMRouter("classification", [
+        ("azure", provider(error=RuntimeError("503"), calls=calls)),
+        ("gemini", provider("from gemini", calls=calls)),
+    ])
+    assert router.call("prompt", timeout=5) == "from gemini"
+    assert len(calls) == 2
+    assert eventually(lambda: get_breaker("azure").failures == 1)
+
+
+def test_router_raises_when_every_provider_fails():
+    router = LLMRouter("summary", [
+        ("gemini", provider(error=RuntimeError("500"))),
+        ("azure", provider(error=ValueError("Empty summary response"))),
+    ])
+    with pytest.raises(RuntimeError, match="All LLM providers failed"):
+        router.call("prompt", timeout=5)
+
+
+def test_open_breaker_is_skipped():
+    calls = []
+    router = LLMRouter("classification", [
+        ("azure", provider("from azure", calls=calls)),
+        ("gemini", provider("from gemini")),
+    ])
+    for _ in range(2):
+        get_breaker("azure").record_failure()
+    assert get_breaker("azure").state == OPEN
+    assert router.call("prompt", timeout=5) == "from gemini"
+    assert calls == []
+
+
+def test_all_breakers_open_raises_without_calling():
+    router = LLMRouter("classification", [("azure", provider("never"))])
+    for _ in range(2):
+        get_breaker("azure").record_failure()
+    with pytest.raises(RuntimeError, match="all circuits open"):
+        router.call("prompt", timeout=5)
+
+
+def test_key_pool_exhaustion_does_not_trip_the_breaker():
+    router = LLMRouter("summary", [
+        ("gemini", provider(error=KeyPoolExhausted("All gemini API keys are at their rate limits"))),
+        ("azure", provider("from azure")),
+    ])
+    for _ in range(5):
+        assert router.call("prompt", timeout=5) == "from azure"
+    assert eventually(lambda: get_breaker("azure").failures == 0)
+    breaker = get_breaker("gemini")
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_hedged_call_takes_the_first_answer(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DEFAULT_DELAY", 0.1)
+    release = threading.Event()
+
+    def slow_primary(prompt, timeout):
+        release.wait(5)
+        return "from azure"
+
+    router = LLMRouter("classification", [("azure", slow_primary), ("gemini", provider("from gemini"))], hedge=True)
+    try:
+        started = time.monotonic()
+        assert router.call("prompt", timeout=5) == "from gemini"
+        assert time.monotonic() - started < 2
+    finally:
+        release.set()
+
+
+def test_unhedged_router_waits_for_the_primary():
+    calls = []
+    router = LLMRouter("summary", [
+        ("gemini", provider("from gemini", delay=0.3)),
+        ("azure", provider("from azure", calls=calls)),
+    ])
+    assert router.call("prompt", timeout=5) == "from gemini"
+    assert calls == []
+
+
+def test_hedge_delay_follows_the_primary_p95(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DEFAULT_DELAY", 5)
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MAX_DELAY", 15)
+    router = LLMRouter("classification", [("azure", provider("a")), ("gemini", provider("g"))], hedge=True)
+    assert router._hedge_delay("azure") == 5
+    for seconds in range(1, 101):
+        router.latency["azure"].observe(seconds / 10)
+    assert router._hedge_delay("azure") == pytest.approx(9.6)
+    for _ in range(100):
+        router.latency["azure"].observe(30)
+    assert router._hedge_delay("azure") == 15
+
+
+def test_router_times_out():
+    release = threading.Event()
+    router = LLMRouter("summary", [("gemini", lambda prompt, timeout: release.wait(5))])
+    try:
+        with pytest.raises(TimeoutError):
+            router.call("prompt", timeout=0.2)
+    finally:
+        release.set()
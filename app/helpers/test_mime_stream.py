@@ -0,0 +1,220 @@
+import io
+import os
+from email import policy
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from app.helpers import mime_stream
+from app.helpers.mime_stream import parse_eml
+
+
+def parse(raw, **kwargs):
+    return parse_eml(io.BytesIO(raw), **kwargs)
+
+
+def close_all(attachments):
+    for attachment in attachments:
+        attachment.close()
+
+
+def test_nested_multipart_prefers_plain_body_and_keeps_attachments():
+    message = EmailMessage()
+    message["Subject"] = "Claim 123"
+    message.set_content("Plain body\nsecond line\n")
+    message.add_alternative("<html><body><p>HTML body</p></body></html>", subtype="html")
+    message.add_attachment(b"%PDF-1.4 fake", maintype="application", subtype="pdf", filename="estimate.pdf")
+    message.add_attachment(b"\x89PNG fake", maintype="image", subtype="png", filename="photo.png")
+
+    text, attachments = parse(message.as_bytes(policy=policy.SMTP))
+    try:
+        assert text.replace("\r\n", "\n") == "Plain body\nsecond line\n"
+        assert [a.name for a in attachments] == ["estimate.pdf", "photo.png"]
+        assert attachments[0].getvalue() == b"%PDF-1.4 fake"
+        assert attachments[1].getvalue() == b"\x89PNG fake"
+    finally:
+        close_all(attachments)
+
+
+def test_attached_message_is_kept_whole_as_eml():
+    inner = EmailMessage()
+    inner["Subject"] = "Forwarded"
+    inner.set_content("inner body")
+    inner.add_attachment(b"inner", maintype="application", subtype="pdf", filename="inner.pdf")
+    outer = EmailMessage()
+    outer.set_content("outer body")
+    outer.add_attachment(inner)
+
+    text, attachments = parse(outer.as_bytes(policy=policy.SMTP))
+    try:
+        assert "outer body" in text and "inner body" not in text
+        assert [a.name for a in attachments] == ["attached_message.eml"]
+        inner_text, inner_attachments = parse(attachments[0].getvalue())
+        assert inner_text.strip() == "inner body"
+        assert [a.name for a in inner_attachments] == ["inner.pdf"]
+        close_all(inner_attachments)
+    finally:
+        close_all(attachments)
+
+
+def test_html_only_body_is_converted_to_text():
+    message = EmailMessage()
+    message.set_content(
+        "<html><body><h1>Demand letter</h1><p>Total due: 500 &euro;</p></body></html>",
+        subtype="html", cte="quoted-printable"
+    )
+
+    text, attachments = parse(message.as_bytes())
+    assert attachments == []
+    assert "<" not in text
+    assert "Demand letter" in text and "Total due: 500 €" in text
+
+
+def test_quoted_printable_split_at_line_limit(monkeypatch):
+    # Lines longer than LINE_LIMIT arrive in pieces; escapes and soft breaks cut by a piece must survive
+    monkeypatch.setattr(mime_stream, "LINE_LIMIT", 8)
+    body = (
+        b"caf=C3=A9 au lait and cr=C3=A8me br=C3=BBl=C3=A9e=\r\n"
+        b" continued=\r\n"
+        b"=\r\n"
+        b"end\r\n"
+    )
+    raw = (
+        b"Content-Type: text/plain; charset=utf-8\r\n"
+        b"Content-Transfer-Encoding: quoted-printable\r\n"
+        b"\r\n" + body
+    )
+
+    text, _ = parse(raw)
+    # The line break before EOF is dropped, like the one before a delimiter
+    assert text == "café au lait and crème brûlée continuedend"
+
+
+def test_quoted_printable_escape_cut_at_every_offset(monkeypatch):
+    expected = "naïve résumé " * 4
+    encoded = "".join(f"={b:02X}" if b > 127 else chr(b) for b in expected.encode("utf-8")).encode("ascii")
+    raw = b"Content-Type: text/plain; charset=utf-8\nContent-Transfer-Encoding: quoted-printable\n\n" + encoded
+    for limit in range(4, 12):
+        monkeypatch.setattr(mime_stream, "LINE_LIMIT", limit)
+        assert parse(raw)[0] == expected
+
+
+def test_large_attachment_is_spilled_to_disk_and_removed_on_close(monkeypatch):
+    monkeypatch.setattr(mime_stream, "EML_SPOOL_MAX_BYTES", 1024)
+    content = os.urandom(64 * 1024)
+    message = EmailMessage()
+    message.set_content("see attached")
+    message.add_attachment(content, maintype="application", subtype="pdf", filename="scan.pdf")
+
+    _, attachments = parse(message.as_bytes())
+    (attachment,) = attachments
+    assert attachment.path is not None and attachment.path.endswith(".pdf")
+    assert attachment.size == len(content)
+    with open(attachment.path, "rb") as f:
+        assert f.read() == content
+    with pytest.raises(ValueError):
+        attachment.getvalue()
+
+    attachment.close()
+    assert not os.path.exists(attachment.path)
+
+
+def test_keep_attachments_false_skips_attachment_content():
+    message = EmailMessage()
+    message.set_content("body only")
+    message.add_attachment(b"data", maintype="application", subtype="pdf", filename="a.pdf")
+
+    text, attachments = parse(message.as_bytes(), keep_attachments=False)
+    assert text.strip() == "body only"
+    assert attachments == []
+
+
+def test_missing_closing_boundary_keeps_parts_up_to_eof():
+    raw = (
+        b"Content-Type: multipart/mixed; boundary=\"outer\"\r\n"
+        b"\r\n"
+        b"--outer\r\n"
+        b"Content-Type: text/plain\r\n"
+        b"\r\n"
+        b"Body text\r\n"
+        b"--outer\r\n"
+        b"Content-Type: application/pdf\r\n"
+        b"Content-Disposition: attachment; filename=\"claim.pdf\"\r\n"
+        b"Content-Transfer-Encoding: base64\r\n"
+        b"\r\n"
+        b"JVBERi0xLjQg\r\n"
+        b"ZmFrZQ==\r\n"
+    )
+
+    text, attachments = parse(raw)
+    try:
+        assert text == "Body text"
+        assert [a.name for a in attachments] == ["claim.pdf"]
+        assert attachments[0].getvalue() == b"%PDF-1.4 fake"
+    finally:
+        close_all(attachments)
+
+
+def test_unterminated_inner_multipart_does_not_swallow_outer_parts():
+    raw = (
+        b"Content-Type: multipart/mixed; boundary=outer\n"
+        b"\n"
+        b"--outer\n"
+        b"Content-Type: multipart/alternative; boundary=inner\n"
+        b"\n"
+        b"--inner\n"
+        b"Content-Type: text/plain\n"
+        b"\n"
+        b"Inner plain\n"
+        b"--outer\n"
+        b"Content-Type: text/csv\n"
+        b"Content-Disposition: attachment; filename=losses.csv\n"
+        b"\n"
+        b"a,b\n"
+        b"--outer--\n"
+        b"epilogue is ignored\n"
+    )
+
+    text, attachments = parse(raw)
+    try:
+        assert text == "Inner plain"
+        assert [a.name for a in attachments] == ["losses.csv"]
+        assert attachments[0].getvalue() == b"a,b"
+    finally:
+        close_all(attachments)
+
+
+def test_spilled_attachment_temp_file_is_removed_after_analyze_file(monkeypatch, tmp_path):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("sqlalchemy")
+    from app.routes import document_data
+
+    monkeypatch.setattr(mime_stream, "EML_SPOOL_MAX_BYTES", 1024)
+    message = EmailMessage()
+    message.set_content("see attached")
+    message.add_attachment(os.urandom(16 * 1024), maintype="application", subtype="pdf", filename="scan.pdf")
+    eml_path = tmp_path / "claim.eml"
+    eml_path.write_bytes(message.as_bytes())
+
+    spilled = []
+
+    def analyze_attachment(name, data, source, parent_name, request_id=None):
+        assert data.path is not None and os.path.exists(data.path)
+        spilled.append(data.path)
+        return {
+            "document_name": name, "doc_type": "Proof of Loss", "summary": "s", "file_url": "url",
+            "content_hash": "h", "processing_time_ms": 1, "stage_timings": {}, "extracted_text": "",
+            "deduplicated": False
+        }
+
+    monkeypatch.setattr(document_data, "find_known_document", lambda content_hash: None)
+    monkeypatch.setattr(document_data, "classify_text", lambda text: ("Customer Communications", "summary"))
+    monkeypatch.setattr(document_data, "upload_file_to_azure_blob", lambda path, name: "url")
+    monkeypatch.setattr(document_data, "analyze_attachment", analyze_attachment)
+
+    result = document_data.analyze_file(str(eml_path), "test", "hash")
+
+    assert [child["document_name"] for child in result["children"]] == ["scan.pdf"]
+    assert spilled and not os.path.exists(spilled[0])
@@ -0,0 +1,137 @@
+from datetime import datetime
+
+import pytest
+
+from app.helpers.spreadsheet import SheetDigest, read_spreadsheet, format_cell, _as_number, _is_identifier, HEAD_ROWS
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$12,500", 12500.0),
+    ("(300.00)", -300.0),
+    ("($1,000.50)", -1000.5),
+    ("-$5", -5.0),
+    ("1,200", 1200.0),
+    ("0.75", 0.75),
+    (".5", 0.5),
+    ("12.5", 12.5),
+])
+def test_amounts_stored_as_text_are_numbers(text, expected):
+    assert _as_number(text) == expected
+
+
+@pytest.mark.parametrize("text", ["12345", "000123", "$0012", "nan", "inf", "1,23", "(5", "$", "", "CLM-1001", "1e5"])
+def test_other_text_stays_text(text):
+    assert _as_number(text) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("Claim Number", True),
+    ("Policy No.", True),
+    ("ID", True),
+    ("Zip", True),
+    ("Claim #", True),
+    ("Number of Claims", False),
+    ("Paid Amount", False),
+    ("Column 3", False),
+])
+def test_identifier_headers(header, expected):
+    assert _is_identifier(header) is expected
+
+
+def digest(rows, **kwargs):
+    sheet = SheetDigest("Losses", **kwargs)
+    for number, values in enumerate(rows, start=1):
+        sheet.add_row(number, values)
+    return sheet
+
+
+def totals_line(text):
+    return next((line for line in text.splitlines() if line.startswith("Totals: ")), None)
+
+
+def test_identifier_columns_are_not_totalled():
+    sheet = digest([
+        ["Claim Number", "Zip", "Paid", "Reserve"],
+        [1001, "02134", "$1,000", 250.0],
+        [1002, "00501", "$2,500.50", 100],
+    ])
+    text = sheet.render(1000)
+    assert totals_line(text) == "Totals: Paid = 3500.5, Reserve = 350"
+    assert "Claim Number: number, 2 values, min 1001, max 1002" in text
+    assert "Zip: text, 2 values" in text
+
+
+def test_non_finite_cells_do_not_poison_totals():
+    sheet = digest([["Claim", "Ratio"]] + [["CLM", 0.5]] * 9 + [["CLM", float("nan")]])
+    text = sheet.render(1000)
+    assert totals_line(text) == "Totals: Ratio = 4.5"
+    assert "Ratio: number, 10 values, min 0.5, max 0.5" in text
+
+
+def test_titles_and_header_row_are_detected():
+    sheet = digest([
+        ["Loss Run as of 2024-01-31"],
+        ["Claim", "Date of Loss", "Paid"],
+        ["CLM-1", datetime(2024, 1, 5), 10],
+    ])
+    text = sheet.render(1000)
+    assert "Title: Loss Run as of 2024-01-31" in text
+    assert "  header: Claim | Date of Loss | Paid" in text
+    assert "Date of Loss: date, 1 values, 2024-01-05 to 2024-01-05" in text
+    assert "  row 3: CLM-1 | 2024-01-05 | 10" in text
+
+
+def test_sample_is_bounded_and_keeps_head_and_last_rows():
+    rows = [["Claim", "Paid"]] + [[f"CLM-{i}", i] for i in range(10000)]
+    sheet = digest(rows, sample_rows=20)
+
+    kept = sheet.rows()
+    assert sheet.row_count == 10000
+    assert len(kept) <= 21
+    assert [number for number, _ in kept[:HEAD_ROWS]] == [2, 3, 4, 5, 6]
+    assert kept[-1][0] == 10001
+    assert [number for number, _ in kept] == sorted(number for number, _ in kept)
+    assert "Totals: Paid = 49995000" in sheet.render(2000)
+
+
+def test_same_sheet_gives_the_same_sample():
+    rows = [["Claim", "Paid"]] + [[f"CLM-{i}", i] for i in range(1000)]
+    assert digest(rows, sample_rows=10).rows() == digest(rows, sample_rows=10).rows()
+
+
+def test_render_stays_within_budget():
+    rows = [["Claim", "Notes"]] + [[f"CLM-{i}", "water damage to the kitchen ceiling " * 3] for i in range(500)]
+    text = digest(rows, sample_rows=100).render(300)
+    assert len(text) <= 300 * 4 + 200
+    assert "sampled rows omitted" in text
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, ""),
+    (3.0, "3"),
+    (2.5, "2.5"),
+    (1 / 3, "0.33"),
+    (datetime(2024, 1, 5), "2024-01-05"),
+    (datetime(2024, 1, 5, 9, 30), "2024-01-05 09:30:00"),
+    ("  spaced\n out  ", "spaced out"),
+])
+def test_format_cell(value, expected):
+    assert format_cell(value) == expected
+
+
+def test_read_spreadsheet_digests_every_sheet(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.title = "Claims"
+    sheet.append(["Policy No.", "Paid"])
+    sheet.append(["0001", "$100"])
+    sheet.append(["0002", "$200"])
+    book.create_sheet("Empty")
+    path = tmp_path / "loss_run.xlsx"
+    book.save(path)
+
+    text = read_spreadsheet(str(path), ".XLSX")
+    assert text.startswith("Sheet: Claims (2 data rows x 2 columns)")
+    assert "Totals: Paid = 300" in text
+    assert "Sheet: Empty (0 data rows x 0 columns)" in text
@@ -0,0 +1,59 @@
+import pytest
+
+from app.helpers.text_selection import select_text, estimate_tokens, KEY_PHRASE_PATTERN, GAP_MARKER
+
+
+def filler(words, tag):
+    return " ".join(f"{tag}{i}" for i in range(words)) + "\n"
+
+
+def test_short_text_is_returned_unchanged():
+    text = "Police report, case number 42."
+    selected, stats = select_text(text, 100)
+    assert selected == text
+    assert stats == {"original_tokens": estimate_tokens(text), "selected_tokens": estimate_tokens(text), "tokens_saved": 0}
+
+
+def test_zero_budget_sends_the_full_text():
+    text = filler(5000, "w")
+    assert select_text(text, 0)[0] == text
+
+
+@pytest.mark.parametrize("budget", [200, 500, 1000, 3000])
+def test_selection_respects_the_budget(budget):
+    text = filler(3000, "head") + "CLAIM SUMMARY:\n" + filler(3000, "mid") + "claim number 123\n" + filler(3000, "tail")
+    selected, stats = select_text(text, budget)
+    # Gap markers are the only overhead beyond the budgeted characters
+    assert estimate_tokens(selected) <= budget + estimate_tokens(GAP_MARKER)
+    assert stats["selected_tokens"] == estimate_tokens(selected)
+    assert stats["tokens_saved"] == stats["original_tokens"] - stats["selected_tokens"]
+
+
+def test_selection_keeps_head_tail_and_key_phrase_windows():
+    text = filler(2000, "head") + filler(2000, "a") + " the sworn statement of the claimant " + filler(2000, "b") + filler(2000, "tail")
+    selected, _ = select_text(text, 1000)
+
+    assert selected.startswith("head0 head1")
+    assert selected.endswith(text[-200:])
+    assert "sworn statement" in selected
+    assert GAP_MARKER in selected
+    # Kept pieces appear in document order
+    assert selected.index("head0") < selected.index("sworn statement") < selected.index("tail1999")
+
+
+def test_header_lines_are_kept_from_the_middle():
+    text = filler(2000, "head") + filler(2000, "a") + "ITEMIZED DAMAGES\n" + filler(2000, "b") + filler(2000, "tail")
+    selected, _ = select_text(text, 1000)
+    assert "ITEMIZED DAMAGES" in selected
+
+
+def test_key_phrases_match_whole_words_only():
+    matches = [m.group().lower() for m in KEY_PHRASE_PATTERN.finditer(
+        "The departments reviewed the PARTS list; see the Police Department estimate and the inpatient file."
+    )]
+    assert matches == ["parts", "police department", "estimate"]
+
+
+def test_longest_phrase_wins():
+    match = KEY_PHRASE_PATTERN.search("Signed under power of attorney")
+    assert match.group() == "power of attorney"
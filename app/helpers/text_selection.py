@@ -0,0 +1,118 @@
+import re
+from prometheus_client import Counter, Histogram
+
+from app.helpers.doc_types import all_key_phrases
+from app.helpers.logger import logger
+
+# Text selection metrics
+try:
+    LLM_TOKENS_SAVED = Counter('llm_tokens_saved_total', 'Estimated input tokens removed by text selection')
+    LLM_SELECTED_TOKENS = Histogram(
+        'llm_selected_tokens', 'Estimated tokens per document before and after text selection', ['stage'],
+        buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000)
+    )
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    LLM_TOKENS_SAVED = REGISTRY._names_to_collectors['llm_tokens_saved_total']
+    LLM_SELECTED_TOKENS = REGISTRY._names_to_collectors['llm_selected_tokens']
+
+CHARS_PER_TOKEN = 4
+GAP_MARKER = "\n[...]\n"
+
+# Whole words only, so short phrases ("parts") do not match inside longer words ("departments")
+KEY_PHRASE_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(phrase) for phrase in sorted(all_key_phrases(), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_header(line):
+    stripped = line.strip()
+    if not stripped or len(stripped) > 80:
+        return False
+    letters = [c for c in stripped if c.isalpha()]
+    if len(letters) < 3:
+        return False
+    return stripped.endswith(":") or sum(c.isupper() for c in letters) / len(letters) > 0.8
+
+
+def _candidate_spans(text, offset, window):
+    """Spans in the middle of the document worth keeping: key-phrase windows first, then headers."""
+    phrase_spans = []
+    for match in KEY_PHRASE_PATTERN.finditer(text):
+        phrase_spans.append((max(0, match.start() - window), min(len(text), match.end() + window)))
+
+    header_spans = []
+    position = 0
+    for line in text.splitlines(keepends=True):
+        if _is_header(line):
+            header_spans.append((position, position + len(line)))
+        position += len(line)
+
+    return [(start + offset, end + offset) for start, end in phrase_spans + header_spans]
+
+
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def select_text(text, budget_tokens, head_share=0.4, tail_share=0.15, window=200):
+    """
+    Fit document text into budget_tokens: the leading part, key-phrase windows
+    and header lines from the middle, and the tail, in document order.
+    Returns (selected_text, stats).
+    """
+    original_tokens = estimate_tokens(text)
+    if not budget_tokens or original_tokens <= budget_tokens:
+        stats = {"original_tokens": original_tokens, "selected_tokens": original_tokens, "tokens_saved": 0}
+        LLM_SELECTED_TOKENS.labels(stage='original').observe(original_tokens)
+        LLM_SELECTED_TOKENS.labels(stage='selected').observe(original_tokens)
+        return text, stats
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    head_chars = int(budget_chars * head_share)
+    tail_chars = int(budget_chars * tail_share)
+    middle_chars = budget_chars - head_chars - tail_chars
+
+    middle_start, middle_end = head_chars, len(text) - tail_chars
+    spans = [(0, head_chars)]
+    used = 0
+    for start, end in _candidate_spans(text[middle_start:middle_end], middle_start, window):
+        length = end - start + len(GAP_MARKER)
+        if used + length > middle_chars:
+            continue
+        spans.append((start, end))
+        used += length
+    spans.append((middle_end, len(text)))
+
+    selected = GAP_MARKER.join(text[start:end] for start, end in _merge(spans))
+    selected_tokens = estimate_tokens(selected)
+    stats = {
+        "original_tokens": original_tokens,
+        "selected_tokens": selected_tokens,
+        "tokens_saved": max(0, original_tokens - selected_tokens)
+    }
+
+    LLM_TOKENS_SAVED.inc(stats["tokens_saved"])
+    LLM_SELECTED_TOKENS.labels(stage='original').observe(original_tokens)
+    LLM_SELECTED_TOKENS.labels(stage='selected').observe(selected_tokens)
+    logger.info("Document text trimmed to token budget", extra={
+        'extra_data': {
+            "event_type": "llm_text_selection",
+            "budget_tokens": budget_tokens,
+            **stats
+        }
+    })
+    return selected, stats
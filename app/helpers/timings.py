@@ -0,0 +1,111 @@
+"""
+Per-document stage timings.
+
+A StageTimer collects how long each stage of one document took. It is bound
+to the processing thread with use_timer(); code further down the pipeline
+records into it through current_timer(), and work handed to thread pools
+captures the timer before submitting. Every stage is also exported as the
+document_stage_seconds histogram, with or without a timer bound.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Histogram
+
+# Stage timing metrics
+try:
+    STAGE_TIME = Histogram(
+        'document_stage_seconds', 'Time spent per document processing stage', ['stage'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+    )
+except ValueError:
+    # Metrics already registered
+    from prometheus_client import REGISTRY
+    STAGE_TIME = REGISTRY._names_to_collectors['document_stage_seconds']
+
+OCR_PAGE_STAGE = "ocr_page"
+
+
+class StageTimer:
+    """Milliseconds per stage for one document, plus the OCR time of each page."""
+
+    def __init__(self):
+        self.stages = {}
+        self.ocr_pages = []
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        STAGE_TIME.labels(stage=stage).observe(seconds)
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def add_page(self, seconds):
+        STAGE_TIME.labels(stage=OCR_PAGE_STAGE).observe(seconds)
+        with self.lock:
+            self.ocr_pages.append(round(seconds * 1000))
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def as_dict(self):
+        with self.lock:
+            timings = {stage: round(ms) for stage, ms in self.stages.items()}
+            if self.ocr_pages:
+                timings["ocr_pages"] = list(self.ocr_pages)
+        return timings
+
+
+_current_timer = ContextVar("stage_timer", default=None)
+
+
+def current_timer():
+    """The StageTimer bound to this context, or None."""
+    return _current_timer.get()
+
+
+@contextmanager
+def use_timer(timer):
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def record_stage(stage, seconds, timer=None):
+    """Record a stage on the given (or current) timer; always export it as a metric."""
+    timer = timer or current_timer()
+    if timer is not None:
+        timer.add(stage, seconds)
+    else:
+        STAGE_TIME.labels(stage=stage).observe(seconds)
+
+
+def record_page(seconds, timer=None):
+    timer = timer or current_timer()
+    if timer is not None:
+        timer.add_page(seconds)
+    else:
+        STAGE_TIME.labels(stage=OCR_PAGE_STAGE).observe(seconds)
+
+
+@contextmanager
+def timed_stage(stage, timer=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, timer)
+
+
+def timed_call(stage, func, *args, timer=None, **kwargs):
+    """Run func and record its duration as stage; for work submitted to pools."""
+    with timed_stage(stage, timer):
+        return func(*args, **kwargs)
@@ -0,0 +1,187 @@
+"""
+Lightweight request tracing.
+
+Spans follow the OpenTelemetry data model (128-bit trace ids, 64-bit span ids,
+parent links, attributes, status) and are exported as one JSON object per
+span in the shape of the OpenTelemetry console exporter. The active span lives
+in a context variable; propagate() carries it into thread pools and
+inject_context()/run_traced() carry it into worker processes as a W3C
+traceparent carrier.
+"""
+
+import os
+import json
+import time
+import logging
+import functools
+import contextvars
+import multiprocessing
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from app.helpers.config import TRACE_EXPORTER, TRACE_FILE, TRACE_SERVICE_NAME
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _trace_file():
+    """TRACE_FILE for the main process; worker processes get their own file, since rotating one file from several processes loses spans."""
+    if multiprocessing.parent_process() is None:
+        return TRACE_FILE
+    base, extension = os.path.splitext(TRACE_FILE)
+    return f"{base}.{os.getpid()}{extension}"
+
+
+# Exporter: a dedicated logger so file rotation and thread safety come from logging
+trace_logger = logging.getLogger("tracing")
+trace_logger.propagate = False
+trace_logger.setLevel(logging.INFO)
+if not trace_logger.handlers:
+    if TRACE_EXPORTER == "file":
+        trace_handler = RotatingFileHandler(_trace_file(), maxBytes=10 * 1024 * 1024, backupCount=5)
+    elif TRACE_EXPORTER == "console":
+        trace_handler = logging.StreamHandler()
+    else:
+        trace_handler = logging.NullHandler()
+    trace_handler.setFormatter(logging.Formatter('%(message)s'))
+    trace_logger.addHandler(trace_handler)
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+class SpanContext:
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.context = SpanContext(parent.trace_id if parent else _new_id(16), _new_id(8))
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "UNSET"
+        self.events = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def trace_id(self):
+        return self.context.trace_id
+
+    @property
+    def span_id(self):
+        return self.context.span_id
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, error):
+        self.status = "ERROR"
+        self.events.append({
+            "name": "exception",
+            "timestamp": time.time_ns(),
+            "attributes": {"exception.type": type(error).__name__, "exception.message": str(error)}
+        })
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        if self.status == "UNSET":
+            self.status = "OK"
+        if TRACE_EXPORTER in ("file", "console"):
+            trace_logger.info(json.dumps(self.to_dict(), default=str))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}"},
+            "kind": "SpanKind.INTERNAL",
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": self.start_ns,
+            "end_time": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": {"status_code": self.status},
+            "attributes": self.attributes,
+            "events": self.events,
+            "resource": {"attributes": {"service.name": TRACE_SERVICE_NAME, "process.pid": os.getpid()}},
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attributes(**attributes):
+    """Set attributes on the active span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+
+
+@contextmanager
+def start_span(name, attributes=None, parent=None):
+    """Open a child of parent (a Span or SpanContext) or of the active span, and make it active."""
+    span = Span(name, parent or _current_span.get(), attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def traced(name=None):
+    """Decorator that runs the function inside a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(func):
+    """
+    Bind func to the caller's context (active span, stage timer, ...) for use
+    on another thread. Each call runs in its own copy, so the wrapper can be
+    mapped over a pool concurrently.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def inject_context():
+    """W3C trace-context carrier for the active span, to hand to another process."""
+    span = _current_span.get()
+    if span is None:
+        return {}
+    return {"traceparent": f"00-{span.trace_id}-{span.span_id}-01"}
+
+
+def extract_context(carrier):
+    """SpanContext from a carrier produced by inject_context(), or None."""
+    try:
+        _, trace_id, span_id, _ = (carrier or {})["traceparent"].split("-")
+        return SpanContext(trace_id, span_id)
+    except (KeyError, ValueError):
+        return None
+
+
+def run_traced(carrier, name, func, *args, **kwargs):
+    """Process-pool entry point: run func in a span parented by the carrier."""
+    with start_span(name, parent=extract_context(carrier)):
+        return func(*args, **kwargs)
@@ -0,0 +1,250 @@
+"""
+End-to-end load test for the ingestion API.
+
+Replays a corpus of files against /document_data/process/, either open-loop at
+a target rate or closed-loop at a fixed concurrency, follows every job through
+/document_data/jobs/{id} and reports latency percentiles, throughput, error
+rates and a per-stage breakdown from the jobs' stage history.
+
+    python -m app.loadtest --corpus Files --concurrency 8 --requests 200
+    python -m app.loadtest --corpus Files --rate 2 --duration 300 --unique-content
+"""
+
+import os
+import glob
+import math
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime
+
+import httpx
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def percentile(values, q):
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def stage_durations(job):
+    """Seconds spent in each stage, from consecutive stage_history entries."""
+    history = job.get("stage_history") or []
+    durations = {}
+    for current, following in zip(history, history[1:]):
+        durations[current["stage"]] = durations.get(current["stage"], 0.0) + following["at"] - current["at"]
+    return durations
+
+
+def load_corpus(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(p for p in glob.glob(os.path.join(path, "**", "*"), recursive=True) if os.path.isfile(p)))
+        else:
+            files.extend(sorted(glob.glob(path)))
+    if not files:
+        raise SystemExit(f"No files found in corpus: {paths}")
+    corpus = []
+    for path in files:
+        with open(path, "rb") as f:
+            corpus.append((os.path.basename(path), f.read()))
+    return corpus
+
+
+class LoadTest:
+    def __init__(self, args, corpus):
+        self.args = args
+        self.corpus = corpus
+        self.samples = []
+        self.sent = 0
+        self.started = None
+
+    def next_file(self):
+        name, content = self.corpus[self.sent % len(self.corpus)] if not self.args.shuffle else random.choice(self.corpus)
+        self.sent += 1
+        if self.args.unique_content:
+            # Trailing bytes defeat content-hash deduplication; PDFs and images ignore them
+            content = content + f"\n%loadtest-{uuid.uuid4().hex}\n".encode()
+        return name, content
+
+    async def run_one(self, client):
+        name, content = self.next_file()
+        sample = {"file": name, "bytes": len(content), "sent_at": time.time() - self.started}
+        started = time.monotonic()
+        try:
+            response = await client.post(
+                "/document_data/process/",
+                files={"file": (name, content)},
+                data={"source": self.args.source}
+            )
+            sample["submit_seconds"] = time.monotonic() - started
+            if response.status_code != 200:
+                sample.update(outcome="submit_error", status_code=response.status_code)
+                return sample
+            job_id = response.json()["job_id"]
+            sample["job_id"] = job_id
+
+            deadline = started + self.args.job_timeout
+            while True:
+                await asyncio.sleep(self.args.poll_interval)
+                response = await client.get(f"/document_data/jobs/{job_id}")
+                if response.status_code != 200:
+                    sample.update(outcome="poll_error", status_code=response.status_code)
+                    return sample
+                job = response.json()
+                if job["status"] in TERMINAL_STATUSES:
+                    break
+                if time.monotonic() > deadline:
+                    sample.update(outcome="timeout", stage=job.get("stage"))
+                    return sample
+
+            sample["latency_seconds"] = time.monotonic() - started
+            sample["server_seconds"] = job["finished_at"] - job["submitted_at"]
+            sample["stages"] = stage_durations(job)
+            sample["outcome"] = "completed" if job["status"] == "completed" else "job_failed"
+            if job.get("error"):
+                sample["error"] = job["error"]
+            result = job.get("result") or {}
+            sample["deduplicated"] = bool(result.get("deduplicated"))
+        except httpx.HTTPError as e:
+            sample.update(outcome="transport_error", error=f"{type(e).__name__}: {str(e)}")
+        return sample
+
+    def should_send(self):
+        if self.args.requests is not None and self.sent >= self.args.requests:
+            return False
+        if self.args.duration is not None and time.time() - self.started >= self.args.duration:
+            return False
+        return True
+
+    async def closed_loop(self, client):
+        async def worker():
+            while self.should_send():
+                self.samples.append(await self.run_one(client))
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, client):
+        # Poisson arrivals at the target rate, independent of how fast the server answers
+        tasks = []
+        while self.should_send():
+            tasks.append(asyncio.create_task(self.run_one(client)))
+            await asyncio.sleep(random.expovariate(self.args.rate))
+        self.samples.extend(await asyncio.gather(*tasks))
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+        async with httpx.AsyncClient(base_url=self.args.base_url, timeout=self.args.request_timeout, limits=limits) as client:
+            self.started = time.time()
+            if self.args.rate:
+                await self.open_loop(client)
+            else:
+                await self.closed_loop(client)
+        return self.report(time.time() - self.started)
+
+    def report(self, elapsed):
+        completed = [s for s in self.samples if s.get("outcome") == "completed"]
+        outcomes = {}
+        for sample in self.samples:
+            outcomes[sample["outcome"]] = outcomes.get(sample["outcome"], 0) + 1
+
+        stages = {}
+        for sample in completed:
+            for stage, seconds in sample["stages"].items():
+                stages.setdefault(stage, []).append(seconds)
+
+        return {
+            "label": self.args.label,
+            "started_at": datetime.utcfromtimestamp(self.started).isoformat() + "Z",
+            "config": {
+                "base_url": self.args.base_url,
+                "mode": "open_loop" if self.args.rate else "closed_loop",
+                "rate": self.args.rate,
+                "concurrency": None if self.args.rate else self.args.concurrency,
+                "requests": self.args.requests,
+                "duration": self.args.duration,
+                "corpus_files": len(self.corpus),
+                "unique_content": self.args.unique_content,
+            },
+            "elapsed_seconds": elapsed,
+            "total": len(self.samples),
+            "outcomes": outcomes,
+            "error_rate": (len(self.samples) - len(completed)) / len(self.samples) if self.samples else 0.0,
+            "throughput_per_second": len(completed) / elapsed if elapsed else 0.0,
+            "deduplicated": sum(1 for s in completed if s.get("deduplicated")),
+            "latency_seconds": summarize([s["latency_seconds"] for s in completed]),
+            "server_seconds": summarize([s["server_seconds"] for s in completed]),
+            "submit_seconds": summarize([s["submit_seconds"] for s in self.samples if "submit_seconds" in s]),
+            "stages": {stage: summarize(values) for stage, values in stages.items()},
+            "samples": self.samples,
+        }
+
+
+def print_report(report):
+    def fmt(stats):
+        if not stats.get("count"):
+            return "n/a"
+        return f"p50 {stats['p50']:.2f}s  p95 {stats['p95']:.2f}s  p99 {stats['p99']:.2f}s  max {stats['max']:.2f}s"
+
+    print(f"Requests: {report['total']}  outcomes: {report['outcomes']}  error rate: {report['error_rate']:.1%}")
+    print(f"Throughput: {report['throughput_per_second']:.2f} docs/s over {report['elapsed_seconds']:.1f}s")
+    print(f"End-to-end: {fmt(report['latency_seconds'])}")
+    print(f"Submit:     {fmt(report['submit_seconds'])}")
+    for stage, stats in sorted(report["stages"].items(), key=lambda item: -(item[1].get("p50") or 0)):
+        print(f"  {stage:<16} {fmt(stats)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /document_data/process/ with a corpus of files.")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--corpus", nargs="+", required=True, help="Directories or glob patterns of files to upload")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: target requests per second")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: requests in flight (ignored with --rate)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after sending this many requests")
+    parser.add_argument("--duration", type=float, default=None, help="Stop sending after this many seconds")
+    parser.add_argument("--source", default="loadtest")
+    parser.add_argument("--shuffle", action="store_true", help="Pick corpus files at random instead of round robin")
+    parser.add_argument("--unique-content", action="store_true", help="Make every upload unique to bypass deduplication")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--job-timeout", type=float, default=600, help="Give up on a job after this many seconds")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--label", default=None, help="Name for this run in the results file")
+    parser.add_argument("--output", default=None, help="Results JSON path (default loadtest_results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(LoadTest(args, load_corpus(args.corpus)).run())
+    print_report(report)
+
+    output = args.output or os.path.join("loadtest_results", f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
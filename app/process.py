@@ -9,6 +9,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.helpers.benchmark import start_benchmarking
 from app.helpers.logger import logger
+from app.database.database import apply_schema_updates
 
 # Import all routers
 from app.routes import (
@@ -49,6 +50,12 @@ app.include_router(logs_router)
 app.include_router(benchmark_router)
 app.include_router(viewer_router)
 
+# Bring document_logs up to date with the model
+try:
+    apply_schema_updates()
+except Exception as e:
+    logger.error(f"Failed to apply schema updates: {str(e)}")
+
 # Start benchmarking system
 start_benchmarking()
 
@@ -0,0 +1,202 @@
+"""
+Bulk reprocessing of document_logs.
+
+Re-runs classification and summary for stored documents after a prompt or
+model change. Rows are walked in id order in fixed-size chunks; each chunk is
+processed in parallel and written back in one transaction, then the last id is
+checkpointed so an interrupted run resumes where it stopped.
+
+    python -m app.reprocess --chunk-size 100 --workers 8
+    python -m app.reprocess --dry-run --diff-file reclassify_diff.jsonl
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from app.helpers.config import REPROCESS_CHECKPOINT_FILE
+from app.helpers.extraction import operation
+from app.helpers.llm import get_gemini_response_with_context
+from app.helpers.doc_types import FAILED_DOC_TYPE, SUMMARY_FALLBACK
+from app.helpers.azure_blob import download_file_from_azure_blob
+from app.helpers.logger import logger
+from app.database.database import sessionlocal, apply_schema_updates
+from app.database.sql import get_documents_after_id, update_document_results
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def fetch_document(doc, work_dir):
+    """Local path to the original file: the stored path if it still exists, else a blob download."""
+    if os.path.exists(doc.file_url):
+        return doc.file_url, False
+    download_path = os.path.join(work_dir, f"{doc.id}_{os.path.basename(doc.document_name)}")
+    if not download_file_from_azure_blob(doc.file_url, download_path):
+        raise FileNotFoundError(f"Could not fetch original file for document {doc.id}")
+    return download_path, True
+
+
+def reprocess_document(doc, work_dir):
+    """Extract and reclassify one row. Returns a result dict; never raises."""
+    result = {
+        "id": doc.id,
+        "document_name": doc.document_name,
+        "old_doc_type": doc.doc_type_predicted,
+        "old_summary": doc.summary,
+    }
+    try:
+        file_path, downloaded = fetch_document(doc, work_dir)
+        try:
+            extracted_text = operation(file_path, doc.source)
+        finally:
+            if downloaded:
+                os.remove(file_path)
+
+        if isinstance(extracted_text, list):
+            text_content = "\n\n".join(str(page) for page in extracted_text)
+        else:
+            text_content = str(extracted_text)
+
+        doc_type, summary = get_gemini_response_with_context(text_content)
+        if doc_type == FAILED_DOC_TYPE:
+            # Every provider failed; never write that over a good classification
+            raise RuntimeError("Classification failed on every LLM provider")
+        result["new_doc_type"] = doc_type
+        # Keep the stored summary rather than overwrite it with the failure placeholder
+        result["new_summary"] = doc.summary if summary == SUMMARY_FALLBACK else summary
+    except Exception as e:
+        logger.error(f"Reprocessing document {doc.id} failed: {str(e)}")
+        result["error"] = str(e)
+    return result
+
+
+def is_changed(result):
+    return "error" not in result and (
+        result["new_doc_type"] != result["old_doc_type"] or result["new_summary"] != result["old_summary"]
+    )
+
+
+def run(args):
+    checkpoint = None if args.reset or args.dry_run else load_checkpoint(args.checkpoint)
+    if args.after_id is not None:
+        last_id = args.after_id
+    elif checkpoint:
+        last_id = checkpoint["last_id"]
+        logger.info(f"Resuming reprocessing after document id {last_id}")
+    else:
+        last_id = 0
+
+    totals = {
+        "processed": checkpoint.get("processed", 0) if checkpoint else 0,
+        "changed": checkpoint.get("changed", 0) if checkpoint else 0,
+        "failed": checkpoint.get("failed", 0) if checkpoint else 0,
+    }
+    diff_file = open(args.diff_file, 'a') if args.diff_file else None
+    run_processed = 0
+    start_time = time.time()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="reprocess_") as work_dir, \
+                ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="reprocess") as executor:
+            while args.limit is None or run_processed < args.limit:
+                chunk_size = args.chunk_size if args.limit is None else min(args.chunk_size, args.limit - run_processed)
+                docs = get_documents_after_id(
+                    sessionlocal(), last_id, chunk_size,
+                    source=args.source, doc_type=args.doc_type, include_corrected=args.include_corrected
+                )
+                if not docs:
+                    break
+
+                results = list(executor.map(lambda doc: reprocess_document(doc, work_dir), docs))
+                changed = [result for result in results if is_changed(result)]
+
+                for result in changed:
+                    line = {key: result[key] for key in ("id", "document_name", "old_doc_type", "new_doc_type")}
+                    if result["new_summary"] != result["old_summary"]:
+                        line.update(old_summary=result["old_summary"], new_summary=result["new_summary"])
+                    if diff_file:
+                        diff_file.write(json.dumps(line) + "\n")
+                    if args.dry_run:
+                        print(f"[{result['id']}] {result['document_name']}: {result['old_doc_type']} -> {result['new_doc_type']}")
+
+                if not args.dry_run:
+                    update_document_results(sessionlocal(), [
+                        {"id": result["id"], "doc_type_predicted": result["new_doc_type"], "summary": result["new_summary"]}
+                        for result in changed
+                    ])
+
+                last_id = docs[-1].id
+                run_processed += len(docs)
+                totals["processed"] += len(docs)
+                totals["changed"] += len(changed)
+                totals["failed"] += sum(1 for result in results if "error" in result)
+
+                if diff_file:
+                    diff_file.flush()
+                if not args.dry_run:
+                    save_checkpoint(args.checkpoint, {
+                        "last_id": last_id,
+                        **totals,
+                        "updated_at": datetime.utcnow().isoformat() + "Z"
+                    })
+
+                logger.info("Reprocessing chunk completed", extra={
+                    'extra_data': {
+                        "event_type": "reprocess_chunk",
+                        "last_id": last_id,
+                        "chunk_size": len(docs),
+                        "changed": len(changed),
+                        "dry_run": args.dry_run,
+                        **totals
+                    }
+                })
+    finally:
+        if diff_file:
+            diff_file.close()
+
+    elapsed = time.time() - start_time
+    print(
+        f"{'Dry run' if args.dry_run else 'Reprocessing'} finished: {run_processed} documents in {elapsed:.1f}s "
+        f"(total processed {totals['processed']}, changed {totals['changed']}, failed {totals['failed']}, last id {last_id})"
+    )
+    return totals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run classification and summary for stored documents.")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Rows fetched and committed per chunk")
+    parser.add_argument("--workers", type=int, default=4, help="Documents processed in parallel")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many documents")
+    parser.add_argument("--after-id", type=int, default=None, help="Start after this id, ignoring the checkpoint")
+    parser.add_argument("--source", default=None, help="Only rows from this source")
+    parser.add_argument("--doc-type", default=None, help="Only rows currently classified as this type")
+    parser.add_argument("--include-corrected", action="store_true", help="Also reprocess manually corrected rows")
+    parser.add_argument("--checkpoint", default=REPROCESS_CHECKPOINT_FILE, help="Checkpoint file for resuming")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--dry-run", action="store_true", help="Print changes without writing to the database")
+    parser.add_argument("--diff-file", default=None, help="Append changed rows as JSON lines to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    apply_schema_updates()
+    run(args)
@@ -1,32 +1,46 @@
 import os
+import json
 import time
 import uuid
+import asyncio
 import shutil
 from pathlib import Path
 import tempfile
 import subprocess
-from typing import Optional
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from fastapi import APIRouter, UploadFile, File, Form, Query, HTTPException
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from prometheus_client import Counter, Histogram, REGISTRY
 
-from app.helpers.extraction import operation
+from app.helpers.extraction import operation, extract_with_attachments, is_supported
 from app.helpers.converters import convert_msg_to_pdf, convert_eml_to_pdf, convert_to_pdf
-from app.helpers.azure_blob import upload_file_to_azure_blob, download_file_from_azure_blob
-from app.helpers.llm import get_gemini_response_with_context
+from app.helpers.azure_blob import upload_file_to_azure_blob, upload_bytes_to_azure_blob, download_file_from_azure_blob
+from app.helpers.llm import get_gemini_response_with_context, classify_batch
+from app.helpers.doc_types import FAILED_DOC_TYPE, FALLBACK_DOC_TYPE
 from app.helpers.logger import logger
+from app.helpers.jobs import job_queue
+from app.helpers.timings import StageTimer, use_timer, timed_stage
+from app.helpers.tracing import start_span, traced, propagate
+from app.helpers.dedup import hash_file, hash_bytes, document_flight, DEDUP_COUNT
+from app.helpers.config import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, ATTACHMENT_WORKERS, STORED_TEXT_MAX_CHARS
 from app.database.database import sessionlocal
 from app.database.sql import (
     insert_document_log,
+    insert_document_with_children,
+    get_child_documents,
     get_details_by_id,
+    get_document_by_content_hash,
     update_document_by_id,
     get_recent_documents,
     get_source_options,
     get_doc_type_count,
     get_avg_processing_time,
     DocRequest,
-    DocUpdateRequest
+    DocUpdateRequest,
+    ClassifyBatchRequest
 )
 
 router = APIRouter(prefix="/document_data", tags=["Document Data"])
@@ -57,13 +71,228 @@ except ValueError:
 UPLOAD_DIR = "uploaded_files"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Email attachments of all documents share this pool
+attachment_executor = ThreadPoolExecutor(max_workers=ATTACHMENT_WORKERS, thread_name_prefix="attachment")
+
 # ✅ FILES STORED IN AZURE BLOB STORAGE
 # All uploaded files are automatically stored in Azure Blob Storage with SAS URLs
 # No local database - uses RetoolDB PostgreSQL for metadata
 
 
-def process_file(file_path, source, request_id=None):
+def find_known_document(content_hash):
+    """Return the stored analysis for previously processed bytes, or None."""
+    db = sessionlocal()
+    try:
+        doc = get_document_by_content_hash(db, content_hash)
+        if not doc:
+            return None
+        children = [
+            {
+                "document_name": child.document_name,
+                "doc_type": child.doc_type_predicted,
+                "summary": child.summary,
+                "file_url": child.file_url,
+                "content_hash": child.content_hash,
+                "processing_time_ms": child.processing_time_ms,
+                "stage_timings": None,
+                "extracted_text": child.extracted_text,
+                "deduplicated": True
+            }
+            for child in get_child_documents(sessionlocal(), doc.id)
+        ]
+        return {
+            "doc_type": doc.doc_type_predicted,
+            "summary": doc.summary,
+            "extracted_text": doc.extracted_text,
+            "file_url": doc.file_url,
+            "storage_type": "Azure Blob" if ".blob.core.windows.net" in str(doc.file_url) else "Local (Fallback)",
+            "reused_document_id": doc.id,
+            "children": children
+        }
+    finally:
+        db.close()
+
+
+def document_text(extracted_text):
+    """Extraction output as one string; page lists are joined so text selection sees real page text."""
+    if isinstance(extracted_text, list):
+        return "\n\n".join(str(page) for page in extracted_text)
+    return str(extracted_text)
+
+
+def classify_text(text_content):
+    """Classify and summarize extracted text. Returns (doc_type, summary); never raises."""
+    AI_REQUEST_COUNT.labels(model='gemini', operation='classification').inc()
+    try:
+        return get_gemini_response_with_context(text_content)
+    except Exception as e:
+        AI_ERROR_COUNT.labels(model='gemini', error_type=type(e).__name__).inc()
+        return FAILED_DOC_TYPE, "Classification failed"
+
+
+def analyze_attachment(name, data, source, parent_name, request_id=None):
+    """Extract, classify and upload one email attachment: bytes, or a SpooledAttachment that may be on disk."""
+    spool_path = getattr(data, "path", None)
+    if spool_path is None and not isinstance(data, bytes):
+        data = data.getvalue()
+    timer = StageTimer()
+    start_time = time.time()
+    size = os.path.getsize(spool_path) if spool_path else len(data)
+    with use_timer(timer), start_span("analyze_attachment", {"file.name": name, "file.size_bytes": size}):
+        content_hash = hash_file(spool_path) if spool_path else hash_bytes(data)
+        try:
+            with timed_stage("dedup_lookup"):
+                known = find_known_document(content_hash)
+        except Exception as e:
+            logger.error(f"Content hash lookup failed: {str(e)}")
+            known = None
+        if known:
+            DEDUP_COUNT.labels(outcome='stored').inc()
+            return {
+                "document_name": name,
+                "doc_type": known["doc_type"],
+                "summary": known["summary"],
+                "file_url": known["file_url"],
+                "content_hash": content_hash,
+                "processing_time_ms": int((time.time() - start_time) * 1000),
+                "stage_timings": timer.as_dict(),
+                "extracted_text": known["extracted_text"],
+                "deduplicated": True
+            }
+        DEDUP_COUNT.labels(outcome='miss').inc()
+        
+        with timed_stage("extraction"):
+            if spool_path:
+                extracted_text = operation(spool_path, source)
+            else:
+                extracted_text = operation(name, source, data=data)
+        text_content = document_text(extracted_text)
+        doc_type, summary = classify_text(text_content)
+        processing_time_ms = int((time.time() - start_time) * 1000)
+        
+        try:
+            with timed_stage("blob_upload"):
+                if spool_path:
+                    with open(spool_path, "rb") as f:
+                        file_url = upload_bytes_to_azure_blob(f, name)
+                else:
+                    file_url = upload_bytes_to_azure_blob(data, name)
+        except Exception as e:
+            logger.error(f"Failed to upload attachment to Azure Blob Storage: {str(e)}")
+            # Fallback: keep the attachment next to its email's upload
+            attachment_dir = os.path.join(UPLOAD_DIR, request_id or "attachments", f"{os.path.splitext(parent_name)[0]}_attachments")
+            os.makedirs(attachment_dir, exist_ok=True)
+            local_path = os.path.join(attachment_dir, os.path.basename(name))
+            if spool_path:
+                shutil.copyfile(spool_path, local_path)
+            else:
+                with open(local_path, "wb") as f:
+                    f.write(data)
+            file_url = os.path.abspath(local_path)
+        
+        return {
+            "document_name": name,
+            "doc_type": doc_type,
+            "summary": summary,
+            "file_url": file_url,
+            "content_hash": content_hash,
+            "processing_time_ms": processing_time_ms,
+            "stage_timings": timer.as_dict(),
+            "extracted_text": text_content[:STORED_TEXT_MAX_CHARS],
+            "deduplicated": False
+        }
+
+
+@traced("analyze_file")
+def analyze_file(file_path, source, content_hash, request_id=None):
+    """Extract, classify and upload a file, reusing the stored analysis when its hash is already known."""
+    file_name = os.path.basename(file_path)
+    start_time = time.time()
+    
+    try:
+        with timed_stage("dedup_lookup"):
+            known = find_known_document(content_hash)
+    except Exception as e:
+        logger.error(f"Content hash lookup failed: {str(e)}")
+        known = None
+    if known:
+        DEDUP_COUNT.labels(outcome='stored').inc()
+        return known
+    DEDUP_COUNT.labels(outcome='miss').inc()
+    
+    job_queue.set_stage(request_id, "extraction")
+    with PROCESSING_TIME.time(), timed_stage("extraction"):
+        extracted_text, attachments = extract_with_attachments(file_path, source)
+    
+    # Attachments go through the pipeline concurrently, alongside the parent's own classification
+    attachment_futures = []
+    try:
+        for name, data in attachments:
+            if not is_supported(name):
+                logger.info(f"Skipping unsupported attachment {name} of {file_name}")
+                continue
+            attachment_futures.append(attachment_executor.submit(
+                propagate(analyze_attachment), name, data, source, file_name, request_id
+            ))
+    
+        # AI Classification with metrics tracking
+        job_queue.set_stage(request_id, "classification")
+        text_content = document_text(extracted_text)
+        doc_type, summary = classify_text(text_content)
+    
+        processing_time_ms = int((time.time() - start_time) * 1000)
+    
+        # Upload to Azure Blob Storage using SAS URL
+        job_queue.set_stage(request_id, "blob_upload")
+        try:
+            with timed_stage("blob_upload"):
+                file_url = upload_file_to_azure_blob(file_path, file_name)
+            logger.info(f"✅ File uploaded to Azure Blob Storage: {file_name}")
+            storage_type = "Azure Blob"
+        except Exception as e:
+            logger.error(f"Failed to upload to Azure Blob Storage: {str(e)}")
+            # Fallback to local absolute path (not recommended for production)
+            file_url = os.path.abspath(file_path)
+            storage_type = "Local (Fallback)"
+    
+        children = []
+        if attachment_futures:
+            job_queue.set_stage(request_id, "attachments")
+            with timed_stage("attachments"):
+                for future in attachment_futures:
+                    try:
+                        children.append(future.result())
+                    except Exception as e:
+                        logger.error(f"Attachment processing failed for {file_name}: {str(e)}")
+    finally:
+        # Spooled .eml attachments hold temporary files until every child is done
+        wait(attachment_futures)
+        for _, data in attachments:
+            if hasattr(data, "close"):
+                data.close()
+    
+    return {
+        "doc_type": doc_type,
+        "summary": summary,
+        "file_url": file_url,
+        "storage_type": storage_type,
+        "processing_time_ms": processing_time_ms,
+        "reused_document_id": None,
+        "extracted_text": text_content[:STORED_TEXT_MAX_CHARS],
+        "children": children
+    }
+
+
+def process_file(file_path, source, request_id=None, timer=None):
     """Process a file: extract text, classify with AI, and store in database."""
+    # Stages anywhere below this call record into the document's timer
+    timer = timer or StageTimer()
+    attributes = {"request_id": request_id, "file.name": os.path.basename(file_path), "source": source}
+    with use_timer(timer), start_span("process_file", attributes):
+        return _process_file(file_path, source, request_id, timer)
+
+
+def _process_file(file_path, source, request_id, timer):
     file_name = os.path.basename(file_path)
     start_time = time.time()
     
@@ -78,50 +307,69 @@ def process_file(file_path, source, request_id=None):
     })
     
     try:
-        with PROCESSING_TIME.time():
-            extracted_text = operation(file_path, source)
+        # Identical bytes share one stored or in-flight analysis
+        job_queue.set_stage(request_id, "hashing")
+        with timer.stage("hashing"):
+            content_hash = hash_file(file_path)
+        flight_start = time.perf_counter()
+        analysis, shared = document_flight.do(
+            content_hash, analyze_file, file_path, source, content_hash, request_id
+        )
+        if shared:
+            # The analysis stages were timed on the leader's document
+            timer.add("dedup_wait", time.perf_counter() - flight_start)
+            DEDUP_COUNT.labels(outcome='in_flight').inc()
+        deduplicated = shared or analysis["reused_document_id"] is not None
         
-        # Convert list to string if needed
-        if isinstance(extracted_text, list):
-            text_content = str(extracted_text)
+        doc_type = analysis["doc_type"]
+        summary = analysis["summary"]
+        file_url = analysis["file_url"]
+        storage_type = analysis["storage_type"]
+        if deduplicated or analysis.get("processing_time_ms") is None:
+            processing_time_ms = int((time.time() - start_time) * 1000)
         else:
-            text_content = extracted_text
+            processing_time_ms = analysis["processing_time_ms"]
         
-        # AI Classification with metrics tracking
-        AI_REQUEST_COUNT.labels(model='gemini', operation='classification').inc()
-        
-        try:
-            doc_type, summary = get_gemini_response_with_context(text_content)
-        except Exception as e:
-            AI_ERROR_COUNT.labels(model='gemini', error_type=type(e).__name__).inc()
-            doc_type, summary = "error", "Classification failed"
-        
-        processing_time_ms = int((time.time() - start_time) * 1000)
-        
-        # Upload to Azure Blob Storage using SAS URL
-        try:
-            file_url = upload_file_to_azure_blob(file_path, file_name)
-            logger.info(f"✅ File uploaded to Azure Blob Storage: {file_name}")
-            storage_type = "Azure Blob"
-        except Exception as e:
-            logger.error(f"Failed to upload to Azure Blob Storage: {str(e)}")
-            # Fallback to local absolute path (not recommended for production)
-            file_url = os.path.abspath(file_path)
-            storage_type = "Local (Fallback)"
+        children = analysis.get("children") or []
         
-        # Store in database using SQLAlchemy
+        # Store in database using SQLAlchemy; an email and its attachments go in one transaction
+        job_queue.set_stage(request_id, "db_write")
         db = sessionlocal()
         try:
+            child_requests = [
+                DocRequest(
+                    document_name=child["document_name"],
+                    source=source,
+                    doc_type_predicted=child["doc_type"],
+                    processing_time_ms=child["processing_time_ms"],
+                    summary=child["summary"],
+                    file_url=child["file_url"],
+                    content_hash=child["content_hash"],
+                    stage_timings=child["stage_timings"],
+                    extracted_text=child["extracted_text"]
+                )
+                for child in children
+            ]
             doc_request = DocRequest(
                 document_name=file_name,
                 source=source,
                 doc_type_predicted=doc_type,
                 processing_time_ms=processing_time_ms,
                 summary=summary,
-                file_url=file_url
+                file_url=file_url,
+                content_hash=content_hash,
+                # db_write itself can only reach the metric and the job result
+                stage_timings=timer.as_dict(),
+                extracted_text=analysis.get("extracted_text")
             )
-            insert_document_log(db, doc_request)
+            with timer.stage("db_write"):
+                if child_requests:
+                    insert_document_with_children(db, doc_request, child_requests)
+                else:
+                    insert_document_log(db, doc_request)
             DOCUMENT_COUNT.labels(doc_type=doc_type).inc()
+            for child in children:
+                DOCUMENT_COUNT.labels(doc_type=child["doc_type"]).inc()
         finally:
             db.close()
         
@@ -135,12 +383,15 @@ def process_file(file_path, source, request_id=None):
                 "doc_type_predicted": doc_type,
                 "processing_time_ms": processing_time_ms,
                 "file_size_bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
-                "extraction_method": "OCR",
-                "storage_type": storage_type
+                "extraction_method": "Deduplicated" if deduplicated else "OCR",
+                "content_hash": content_hash,
+                "storage_type": storage_type,
+                "attachment_count": len(children),
+                "stage_timings": timer.as_dict()
             }
         })
         
-        if doc_type.strip().lower() == "other":
+        if doc_type == FALLBACK_DOC_TYPE:
             logger.warning("Manual classification required", extra={
                 'extra_data': {
                     "request_id": request_id,
@@ -151,7 +402,28 @@ def process_file(file_path, source, request_id=None):
                 }
             })
         
-        return True
+        return {
+            "file_name": file_name,
+            "source": source,
+            "doc_type_predicted": doc_type,
+            "summary": summary,
+            "processing_time_ms": processing_time_ms,
+            "file_url": file_url,
+            "storage_type": storage_type,
+            "content_hash": content_hash,
+            "deduplicated": deduplicated,
+            "stage_timings": timer.as_dict(),
+            "attachments": [
+                {
+                    "file_name": child["document_name"],
+                    "doc_type_predicted": child["doc_type"],
+                    "summary": child["summary"],
+                    "file_url": child["file_url"],
+                    "deduplicated": child["deduplicated"]
+                }
+                for child in children
+            ]
+        }
     
     except Exception as e:
         logger.error("File processing failed", extra={
@@ -166,9 +438,19 @@ def process_file(file_path, source, request_id=None):
         raise
 
 
+def spool_upload(file: UploadFile, request_id: str) -> str:
+    """Persist an uploaded file under a per-request folder and return its path."""
+    request_dir = os.path.join(UPLOAD_DIR, request_id)
+    os.makedirs(request_dir, exist_ok=True)
+    file_location = os.path.join(request_dir, os.path.basename(file.filename))
+    with open(file_location, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return file_location
+
+
 @router.post("/process/")
 async def process_document(file: UploadFile = File(...), source: str = Form("API")):
-    """Upload and process a document."""
+    """Upload a document and queue it for processing. Poll /document_data/jobs/{job_id} for the result."""
     request_id = str(uuid.uuid4())
     REQUEST_COUNT.labels(method='POST', endpoint='/process/').inc()
     
@@ -183,27 +465,30 @@ async def process_document(file: UploadFile = File(...), source: str = Form("API
     })
     
     try:
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        timer = StageTimer()
+        # The queued job continues this trace
+        with start_span("POST /document_data/process/", {"request_id": request_id, "file.name": file.filename}):
+            with timer.stage("spool"):
+                file_location = await run_in_threadpool(spool_upload, file, request_id)
+            job_queue.submit(request_id, process_file, file_location, source, request_id, timer)
         
-        process_file(file_location, source, request_id)
-        
-        logger.info("Document processing completed successfully", extra={
+        logger.info("Document queued for processing", extra={
             'extra_data': {
                 "request_id": request_id,
-                "event_type": "document_processing_success",
+                "event_type": "document_processing_queued",
                 "filename": file.filename,
-                "status": "success"
+                "status": "queued"
             }
         })
         
         return {
-            "message": f"File '{file.filename}' processed successfully.",
-            "request_id": request_id
+            "message": f"File '{file.filename}' queued for processing.",
+            "request_id": request_id,
+            "job_id": request_id,
+            "status": "queued"
         }
     except Exception as e:
-        logger.error("Document processing failed", extra={
+        logger.error("Document upload failed", extra={
             'extra_data': {
                 "request_id": request_id,
                 "event_type": "document_processing_error",
@@ -215,6 +500,116 @@ async def process_document(file: UploadFile = File(...), source: str = Form("API
         return {"error": str(e), "request_id": request_id}
 
 
+@router.post("/process_batch/")
+async def process_document_batch(
+    files: List[UploadFile] = File(...),
+    source: str = Form("API"),
+    concurrency: Optional[int] = Form(None)
+):
+    """
+    Upload many documents and process them concurrently.
+    Streams one NDJSON line per file as each one finishes.
+    """
+    batch_id = str(uuid.uuid4())
+    REQUEST_COUNT.labels(method='POST', endpoint='/process_batch/').inc()
+    limit = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    
+    logger.info("Batch upload initiated", extra={
+        'extra_data': {
+            "request_id": batch_id,
+            "event_type": "batch_upload_start",
+            "file_count": len(files),
+            "source": source,
+            "concurrency": limit
+        }
+    })
+    
+    # Spool every upload before streaming starts; the request files are closed once the handler returns
+    spooled = []
+    for file in files:
+        request_id = str(uuid.uuid4())
+        timer = StageTimer()
+        try:
+            with timer.stage("spool"):
+                file_location = await run_in_threadpool(spool_upload, file, request_id)
+            spooled.append((file.filename, request_id, file_location, timer, None))
+        except Exception as e:
+            spooled.append((file.filename, request_id, None, timer, e))
+    
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run_one(filename, request_id, file_location, timer, spool_error):
+        if spool_error is not None:
+            return {"filename": filename, "request_id": request_id, "status": "failed", "error": str(spool_error)}
+        async with semaphore:
+            try:
+                with start_span("batch_document", {"batch_id": batch_id, "request_id": request_id}):
+                    result = await run_in_threadpool(process_file, file_location, source, request_id, timer)
+                return {"filename": filename, "request_id": request_id, "status": "completed", "result": result}
+            except Exception as e:
+                return {"filename": filename, "request_id": request_id, "status": "failed", "error": str(e)}
+    
+    async def stream_results():
+        tasks = [asyncio.ensure_future(run_one(*item)) for item in spooled]
+        completed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                completed += 1
+                line["batch_id"] = batch_id
+                yield json.dumps(line, default=str) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            logger.info("Batch processing finished", extra={
+                'extra_data': {
+                    "request_id": batch_id,
+                    "event_type": "batch_processing_complete",
+                    "file_count": len(spooled),
+                    "completed": completed
+                }
+            })
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Get the state, current stage and result of a queued document job."""
+    REQUEST_COUNT.labels(method='GET', endpoint='/jobs').inc()
+    
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/classify_batch/")
+def classify_document_batch(data: ClassifyBatchRequest):
+    """
+    Classify many short document texts, packing several into each LLM prompt.
+    Intended for backfills; returns one doc type per text, in order, and the
+    indexes of the texts that could not be classified.
+    """
+    REQUEST_COUNT.labels(method='POST', endpoint='/classify_batch').inc()
+    
+    if not data.texts:
+        raise HTTPException(status_code=400, detail="No texts provided")
+    
+    start_time = time.time()
+    doc_types = classify_batch(data.texts, data.batch_size)
+    failed = [index for index, doc_type in enumerate(doc_types) if doc_type == FAILED_DOC_TYPE]
+    logger.info("Batch classification completed", extra={
+        'extra_data': {
+            "event_type": "batch_classification",
+            "documents": len(data.texts),
+            "failed": len(failed),
+            "processing_time_ms": int((time.time() - start_time) * 1000)
+        }
+    })
+    return {"count": len(doc_types), "doc_types": doc_types, "failed": failed}
+
+
 @router.get("/recent_documents/")
 def recent_documents(
     selected_source: Optional[str] = Query(None),
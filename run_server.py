@@ -1,5 +1,7 @@
 import uvicorn
-from app.process import app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # Imported here, not at module level: spawned worker processes re-import this
+    # file as __mp_main__ and must not build the app, migrate the DB or start schedulers
+    from app.process import app
+    uvicorn.run(app, host="0.0.0.0", port=8080)